@@ -38,6 +38,11 @@ from bpy_extras import view3d_utils
 from mathutils import Vector
 from pathlib import Path
 import math
+import time
+import heapq
+import numpy
+import threading
+import concurrent.futures
 
 from gpu_extras.presets import draw_circle_2d
 from gpu_extras.batch import batch_for_shader
@@ -74,17 +79,55 @@ def cmp(clr1, clr2):
     delta = 0.03
     return abs(clr1[0] - clr2[0]) < delta and abs(clr1[1] - clr2[1]) < delta and abs(clr1[2] - clr2[2]) < delta
 
-def getPixel(X, Y):
+def readPixels(X, Y, width, height): # ( height, width, 3 ) array of framebuffer colors from one read_color
     fb = gpu.state.active_framebuffer_get()
-    screen_buffer = fb.read_color(X, Y, 1, 1, 3, 0, 'FLOAT')
+    screen_buffer = fb.read_color(X, Y, width, height, 3, 0, 'FLOAT')
+    screen_buffer.dimensions = width * height * 3
+    return numpy.array(screen_buffer, dtype=numpy.float32).reshape(height, width, 3)
 
-    rgb_as_list = screen_buffer.to_list()[0]
 
-    R = rgb_as_list[0][0]
-    G = rgb_as_list[0][1]
-    B = rgb_as_list[0][2]
+class PixelSampler:
+    """Averaged or median NxN color samples of the window framebuffer.
+A tile around the cursor is read once and reused until the next redraw.
+"""
 
-    return R, G, B
+    def __init__(self, tile = 32):
+        self.tile = tile
+        self.block = None
+        self.valid = None
+        self.origin = None
+        self.generation = None
+
+    def sample(self, X, Y, size, median, generation, bounds, exclude = None):
+        """Color of the size x size block around X, Y in window coordinates.
+exclude is a window rectangle ( x0, y0, x1, y1 ) the caller drew over itself, its pixels are left out
+of a tile read now. None if every pixel of the block is excluded.
+"""
+        half = size // 2
+        tile = max(self.tile, size)
+        if self.block is None or generation != self.generation \
+            or not (self.origin[0] <= X - half and X - half + size <= self.origin[0] + tile) \
+            or not (self.origin[1] <= Y - half and Y - half + size <= self.origin[1] + tile):
+            ox = min(max(X - tile // 2, 0), max(bounds[0] - tile, 0))
+            oy = min(max(Y - tile // 2, 0), max(bounds[1] - tile, 0))
+            self.block = readPixels(ox, oy, tile, tile)
+            self.valid = numpy.ones((tile, tile), dtype=bool)
+            if exclude:
+                x0, y0, x1, y1 = exclude
+                self.valid[max(y0 - oy, 0):max(y1 - oy, 0), max(x0 - ox, 0):max(x1 - ox, 0)] = False
+            self.origin = (ox, oy)
+            self.generation = generation
+
+        # kernel clamped to the tile at window borders
+        x0 = min(max(X - half - self.origin[0], 0), self.block.shape[1] - size)
+        y0 = min(max(Y - half - self.origin[1], 0), self.block.shape[0] - size)
+        pixels = self.block[y0:y0 + size, x0:x0 + size].reshape(-1, 3)
+        valid = self.valid[y0:y0 + size, x0:x0 + size].reshape(-1)
+        if not valid.all():
+            if not valid.any(): return None
+            pixels = pixels[valid]
+        value = numpy.median(pixels, axis=0) if median else pixels.mean(axis=0)
+        return tuple(float(v) for v in value)
 
 def centerCamera(context):
     # center and offset camera view
@@ -96,6 +139,293 @@ def centerCamera(context):
             r3d.view_camera_offset = [0.05, -0.005]
 
 
+def strokeSegments(base, count, cyclic): # ( index, index ) pairs of a stroke whose points start at base
+    segments = [ (idx, idx + 1) for idx in range(base, base + count - 1) ]
+    if cyclic and count > 2:
+        segments.append( (base + count - 1, base) )
+    return segments
+
+
+class ScreenGrid:
+    """Uniform screen-space grid over 3d points, plus an R-tree over the segments between them.
+Points are projected once and only reprojected when the view changes.
+"""
+
+    def __init__(self, cell = 10):
+        self.cell = cell
+        self.points = []
+        self.segments = []
+        self.screen = []
+        self.cells = {}
+        self.segment_tree = None
+        self.extra_segments = []
+        self.view = None
+
+    def set_points(self, points, segments = ()): # list of 3d tuples, ( index, index ) pairs into points
+        self.points = list(points)
+        self.segments = list(segments)
+        self.view = None
+
+    def add_points(self, points, segments = ()):
+        """Append points and segments, projecting only the new ones when the view is unchanged"""
+        start = len(self.points)
+        first = len(self.segments)
+        self.points.extend(points)
+        self.segments.extend(segments)
+        if self.view != None:
+            self.project(start)
+            # new segments are scanned linearly until the next view change rebuilds the tree
+            self.extra_segments.extend(range(first, len(self.segments)))
+
+    def update(self, context):
+        view = viewKey(context.region, context.space_data.region_3d)
+        if view == self.view:
+            return
+        self.view = view
+        self.cells = {}
+        self.screen = []
+        self.project(0)
+        self.segment_tree = boxTree( (box, sdx) for sdx, box in enumerate(map(self.segment_box, self.segments)) if box )
+        self.extra_segments = []
+
+    def project(self, start):
+        # same projection as view3d_utils.location_3d_to_region_2d
+        width, height, m = self.view
+        a0, a1, a2, a3, b0, b1, b2, b3 = m[:8]
+        w0, w1, w2, w3 = m[12:]
+        half_w = width / 2
+        half_h = height / 2
+        for idx in range(start, len(self.points)):
+            x, y, z = self.points[idx]
+            w = w0 * x + w1 * y + w2 * z + w3
+            if w <= 0:
+                self.screen.append(None)
+                continue
+            sx = half_w + half_w * (a0 * x + a1 * y + a2 * z + a3) / w
+            sy = half_h + half_h * (b0 * x + b1 * y + b2 * z + b3) / w
+            self.screen.append( (sx, sy, w) )
+            self.cells.setdefault((int(sx // self.cell), int(sy // self.cell)), []).append((sx, sy, idx))
+
+    def segment_box(self, segment):
+        p1 = self.screen[segment[0]]
+        p2 = self.screen[segment[1]]
+        if p1 == None or p2 == None:
+            return None
+        return edgeBox( (p1[:2], p2[:2]) )
+
+    def lift(self, sdx, t): # 3d point at screen parameter t along a segment, perspective correct
+        i, j = self.segments[sdx]
+        wi = self.screen[i][2]
+        wj = self.screen[j][2]
+        s = (t / wj) / ((1 - t) / wi + t / wj)
+        a = self.points[i]
+        b = self.points[j]
+        return ( a[0] + (b[0] - a[0]) * s, a[1] + (b[1] - a[1]) * s, a[2] + (b[2] - a[2]) * s )
+
+    def nearest(self, context, pos, radius):
+        """( 3d point, 2d point ) nearest to pos closer than radius pixels, or None"""
+        found = self.nearest_index(context, pos, radius)
+        if found:
+            return (self.points[found[0]], found[1])
+        return None
+
+    def nearest_index(self, context, pos, radius):
+        """( point index, 2d point ) nearest to pos closer than radius pixels, or None"""
+        self.update(context)
+        cx = int(pos[0] // self.cell)
+        cy = int(pos[1] // self.cell)
+        reach = math.ceil(radius / self.cell)
+
+        found = None
+        for gx in range(cx - reach, cx + reach + 1):
+            for gy in range(cy - reach, cy + reach + 1):
+                for sx, sy, idx in self.cells.get((gx, gy), ()):
+                    dist = math.hypot(sx - pos[0], sy - pos[1])
+                    if dist < radius:
+                        radius = dist
+                        found = (idx, (sx, sy))
+        return found
+
+    def near_segments(self, context, pos, radius):
+        self.update(context)
+        box = (pos[0] - radius, pos[1] - radius, pos[0] + radius, pos[1] + radius)
+        found = boxTreeQuery(self.segment_tree, box)
+        for sdx in self.extra_segments:
+            sbox = self.segment_box(self.segments[sdx])
+            if sbox and boxesOverlap(sbox, box):
+                found.append(sdx)
+        return found
+
+    def nearest_on_segment(self, context, pos, radius):
+        """( 3d point, 2d point ) on the segment nearest to pos closer than radius pixels, or None"""
+        found = self.nearest_segment(context, pos, radius)
+        if found:
+            return (self.lift(found[0], found[1]), found[2])
+        return None
+
+    def nearest_segment(self, context, pos, radius):
+        """( segment index, screen parameter, 2d point ) of the segment nearest to pos closer than radius pixels, or None"""
+        found = None
+        for sdx in self.near_segments(context, pos, radius):
+            x1, y1 = self.screen[self.segments[sdx][0]][:2]
+            x2, y2 = self.screen[self.segments[sdx][1]][:2]
+            dx = x2 - x1
+            dy = y2 - y1
+            length = dx * dx + dy * dy
+            if length == 0: continue
+            t = min(1, max(0, ((pos[0] - x1) * dx + (pos[1] - y1) * dy) / length))
+            sx = x1 + dx * t
+            sy = y1 + dy * t
+            dist = math.hypot(sx - pos[0], sy - pos[1])
+            if dist < radius:
+                radius = dist
+                found = (sdx, t, (sx, sy))
+        return found
+
+    def nearest_intersection(self, context, pos, radius):
+        """( 3d point, 2d point ) of the segment crossing nearest to pos closer than radius pixels, or None"""
+        near = self.near_segments(context, pos, radius)
+        found = None
+        for n, sdx in enumerate(near):
+            i1, j1 = self.segments[sdx]
+            x1, y1 = self.screen[i1][:2]
+            x2, y2 = self.screen[j1][:2]
+            for odx in near[n + 1:]:
+                i2, j2 = self.segments[odx]
+                if i2 in (i1, j1) or j2 in (i1, j1): # neighbours meet at a vertex
+                    continue
+                x3, y3 = self.screen[i2][:2]
+                x4, y4 = self.screen[j2][:2]
+                denom = (x2 - x1) * (y4 - y3) - (y2 - y1) * (x4 - x3)
+                if denom == 0: continue
+                t = ((x3 - x1) * (y4 - y3) - (y3 - y1) * (x4 - x3)) / denom
+                u = ((x3 - x1) * (y2 - y1) - (y3 - y1) * (x2 - x1)) / denom
+                if t < 0 or t > 1 or u < 0 or u > 1: continue
+                sx = x1 + (x2 - x1) * t
+                sy = y1 + (y2 - y1) * t
+                dist = math.hypot(sx - pos[0], sy - pos[1])
+                if dist < radius:
+                    radius = dist
+                    found = (self.lift(sdx, t), (sx, sy))
+        return found
+
+
+def viewKey(region, region_3d): # changes whenever 3d points would project elsewhere on screen
+    return (region.width, region.height, tuple(v for row in region_3d.perspective_matrix for v in row))
+
+
+_overlay_shaders = {}
+
+def overlayShader(name = 'UNIFORM_COLOR'): # builtin shaders are fetched once and reused
+    shader = _overlay_shaders.get(name)
+    if shader == None:
+        shader = _overlay_shaders[name] = gpu.shader.from_builtin(name)
+    return shader
+
+
+class OverlayBatch:
+    """One line batch and one POINTS batch for 2d overlay strips.
+Batches are only rebuilt when the key passed to update changes,
+the POINTS batch only for overlays that draw their points.
+"""
+
+    def __init__(self):
+        self.key = None
+        self.lines = None
+        self.points = None
+        self.coords = []
+
+    def update(self, key, strips):
+        if key == self.key:
+            return
+        self.key = key
+        self.lines = None
+        self.points = None
+
+        strips = [ strip for strip in strips if len(strip) > 0 ]
+        if len(strips) == 1 and len(strips[0]) > 1:
+            self.lines = batch_for_shader(overlayShader(), 'LINE_STRIP', {"pos": strips[0]})
+        elif len(strips) > 1: # several strips go into one batch as separate segments
+            pairs = [ pt for strip in strips for seg in zip(strip, strip[1:]) for pt in seg ]
+            if len(pairs) > 0:
+                self.lines = batch_for_shader(overlayShader(), 'LINES', {"pos": pairs})
+
+        self.coords = [ pt for strip in strips for pt in strip ]
+
+    def draw_lines(self, color, width):
+        if self.lines == None: return
+        shader = overlayShader()
+        gpu.state.line_width_set(width)
+        shader.uniform_float("color", color)
+        self.lines.draw(shader)
+
+    def draw_points(self, color, size):
+        if self.points == None:
+            if len(self.coords) == 0: return
+            self.points = batch_for_shader(overlayShader('POINT_UNIFORM_COLOR'), 'POINTS', {"pos": self.coords})
+        shader = overlayShader('POINT_UNIFORM_COLOR')
+        gpu.state.point_size_set(size)
+        shader.uniform_float("color", color)
+        self.points.draw(shader)
+
+
+class RefreshThrottle:
+    """Coalesces modal events so an expensive refresh runs at most once per redraw, or at rate updates per second.
+Deltas requested between refreshes are summed and handed over by take().
+"""
+
+    def __init__(self, rate = 0):
+        self.rate = rate # 0 = once per redraw
+        self.delta = 0
+        self.pending = False
+        self.drawn = True
+        self.last = 0.0
+        self.times = []
+        self._timer = None
+        self._handle = None
+
+    def start(self, context):
+        # the timer flushes a pending refresh once events stop, the draw handler marks each redraw
+        self._timer = context.window_manager.event_timer_add(1.0 / (self.rate if self.rate > 0 else 60), window=context.window)
+        self._handle = bpy.types.SpaceView3D.draw_handler_add(self.on_draw, (), 'WINDOW', 'POST_PIXEL')
+
+    def stop(self, context):
+        if self._timer:
+            context.window_manager.event_timer_remove(self._timer)
+            self._timer = None
+        if self._handle:
+            bpy.types.SpaceView3D.draw_handler_remove(self._handle, 'WINDOW')
+            self._handle = None
+
+    def on_draw(self):
+        self.drawn = True
+
+    def request(self, delta = 0):
+        self.delta += delta
+        self.pending = True
+
+    def ready(self):
+        if not self.pending: return False
+        elapsed = time.perf_counter() - self.last
+        if self.rate > 0:
+            return elapsed >= 1.0 / self.rate
+        return self.drawn or elapsed > 0.1 # don't wait forever on a view that was not redrawn
+
+    def take(self):
+        """Summed delta of the pending requests, marks the refresh as done"""
+        delta = self.delta
+        self.delta = 0
+        self.pending = False
+        self.drawn = False
+        self.last = time.perf_counter()
+        self.times = [ t for t in self.times if self.last - t < 1.0 ] + [ self.last ]
+        return delta
+
+    def rate_text(self): # effective refreshes per second over the last second
+        if len(self.times) < 2: return ""
+        return "  (%d updates/s)" % round((len(self.times) - 1) / max(self.times[-1] - self.times[0], 0.001))
+
+
 
 class quickFrameSelectionOperator(bpy.types.Operator):
     """
@@ -106,11 +436,15 @@ Shift click to zoom to selected points
     bl_idname = "quicktools.frame_selection"
     bl_label = "Frame Selection"
 
+    update_rate : bpy.props.IntProperty(name="Update Rate", description="Updates per second while adjusting, 0 updates once per redraw", default=0, min=0, max=240)
+
     _timer = None
+    _throttle = None
     _handle = None
     _counter = 0
     _first = _last = None
     _mousepos = None
+    _overlay = None
     _min3d = _max3d = None
     _minx = _maxx = _miny = _maxy = None
 
@@ -215,6 +549,12 @@ Shift click to zoom to selected points
                     self._timer = wm.event_timer_add(0.001, window=context.window)
 
         if event.type == 'TIMER' and self._last:
+            # one pan / zoom step per redraw, however fast the timer fires
+            self._throttle.request()
+            if not self._throttle.ready(): return {'RUNNING_MODAL'}
+            self._throttle.take()
+            context.area.header_text_set("Frame Selection" + self._throttle.rate_text())
+
             if self._handle:
                 bpy.types.SpaceView3D.draw_handler_remove(self._handle, 'WINDOW')
                 self._handle = None
@@ -246,19 +586,17 @@ Shift click to zoom to selected points
             lines.append( (self._first[0], self._mousepos[1]) )
             lines.append(self._first)
             
-            shader = gpu.shader.from_builtin('UNIFORM_COLOR')
+            self._overlay.update( (self._first, self._mousepos), [lines] )
             gpu.state.blend_set('ALPHA')
-            batch = batch_for_shader(shader, 'LINE_STRIP', {"pos": lines})
-            gpu.state.line_width_set(3.0)
-            shader.uniform_float("color", (1.0, 1.0, 1.0, 1.0))
-            batch.draw(shader)
-            gpu.state.line_width_set(2.0)
-            shader.uniform_float("color", (0.0, 0.0, 0.0, 1.0))
-            batch.draw(shader)
+            self._overlay.draw_lines( (1.0, 1.0, 1.0, 1.0), 3.0 )
+            self._overlay.draw_lines( (0.0, 0.0, 0.0, 1.0), 2.0 )
 
     def execute(self, context):
         if self._timer: wm.event_timer_remove(self._timer)
         self._first = None
+        self._overlay = OverlayBatch()
+        self._throttle = RefreshThrottle(self.update_rate)
+        self._throttle.start(context)
         args = (context,)
         self._handle = bpy.types.SpaceView3D.draw_handler_add(self.draw_callback_px, args, 'WINDOW', 'POST_PIXEL')
         wm = context.window_manager
@@ -277,6 +615,10 @@ Shift click to zoom to selected points
         if self._handle:
             bpy.types.SpaceView3D.draw_handler_remove(self._handle, 'WINDOW')
             self._handle = None
+        if self._throttle:
+            self._throttle.stop(context)
+            self._throttle = None
+        context.area.header_text_set(None)
         context.window.cursor_modal_restore()
         return {'FINISHED'}
 
@@ -285,13 +627,27 @@ class quickEyeDropperOperator(bpy.types.Operator):
     """Left click to sample Fill color.
 SHIFT-Left click to sample Stroke color.
 CTRL-Left click to sample a selected Point's radius
+ALT-Left click to copy the attributes of the stroke under the cursor
 """
 
     bl_idname = "quicktools.eyedropper"
     bl_label = "QuickTools Color Eyedropper"
     bl_options = {'REGISTER' }
+
+    sample_attributes : bpy.props.BoolProperty(name="Sample Attributes", description="Copy color, radius, opacity and softness from the stroke under the cursor instead of reading screen pixels", default=False)
+    sample_size : bpy.props.IntProperty(name="Sample Size", description="Average an NxN block of pixels around the cursor", default=1, min=1, max=15)
+    sample_median : bpy.props.BoolProperty(name="Median", description="Use the median of the sampled block instead of its average", default=False)
+    live_swatch : bpy.props.BoolProperty(name="Live Swatch", description="Show the color under the cursor while moving", default=False)
     
-    _selectedPoint = _drawPoint = _handle = None
+    _selectedRadius = _drawPoint = _handle = None
+    _sampler = None
+    _redraws = 0
+    _swatch = _swatchPos = None
+    _grid = None
+    _radii = []
+    _strokes = []
+    _point_strokes = []
+    _fill_tree = _fill_view = None
     
     @classmethod
     def poll(self, context):
@@ -306,14 +662,136 @@ CTRL-Left click to sample a selected Point's radius
         lw = gpu.state.line_width_get()
         gpu.state.line_width_set(2.0)
 
-        if self._selectedPoint:
+        if self._drawPoint:
             draw_circle_2d(self._drawPoint, col, radius)
+        gpu.state.line_width_set(lw)
+
+        if self.live_swatch and self._swatch and self._swatchPos:
+            x, y = self._swatchPos
+            rect = [ (x, y), (x + 24, y), (x + 24, y + 24), (x, y), (x + 24, y + 24), (x, y + 24) ]
+            shader = overlayShader()
+            batch = batch_for_shader(shader, 'TRIS', {"pos": rect})
+            shader.uniform_float("color", (self._swatch[0], self._swatch[1], self._swatch[2], 1.0))
+            batch.draw(shader)
+
+        # cached pixels are stale from here on
+        self._redraws += 1
+
+    def samplePixel(self, context, event):
+        # the swatch drawn at the last redraw is in the framebuffer too, it must not sample itself
+        exclude = None
+        if self.live_swatch and self._swatch and self._swatchPos:
+            x = self._swatchPos[0] + event.mouse_x - event.mouse_region_x
+            y = self._swatchPos[1] + event.mouse_y - event.mouse_region_y
+            exclude = (x, y, x + 24, y + 24)
+        return self._sampler.sample(event.mouse_x, event.mouse_y, self.sample_size, self.sample_median, 
+            self._redraws, (context.window.width, context.window.height), exclude)
+
+    def sampleText(self, context):
+        n = self.sample_size
+        context.area.header_text_set(f"Sample: {n}x{n} {'median' if self.sample_median else 'average'}, Wheel = size, M = median, S = swatch")
+
+    def init_points(self, context): # positions and radii of all points that can be sampled, and the strokes they belong to
+        gp = context.active_object
+        use_multiedit = context.tool_settings.use_grease_pencil_multi_frame_editing
+        points = []
+        segments = []
+        self._radii = []
+        self._strokes = [] # ( drawing, stroke index, first point, point count, has fill )
+        self._point_strokes = []
+        for lr in gp.data.layers: # bottom layer first, so later strokes are drawn on top
+            if lr.lock or lr.hide:
+                continue
+            frames = [fr for fr in lr.frames if fr.select or fr == lr.current_frame()] if use_multiedit else [lr.current_frame()]
+            for fr in frames:
+                if fr == None: continue
+                base = len(points)
+                for idx, s in enumerate(fr.drawing.strokes):
+                    n = len(s.points)
+                    segments.extend(strokeSegments(base, n, s.cyclic))
+                    self._point_strokes.extend([len(self._strokes)] * n)
+                    self._strokes.append( (fr.drawing, idx, base, n, n > 2 and self.showsFill(gp, s.material_index)) )
+                    base += n
+                flat = readAttribute(fr.drawing, 'position', 'FLOAT_VECTOR', 'POINT')
+                points.extend(zip(flat[0::3], flat[1::3], flat[2::3]))
+                if fr.drawing.attributes.get('radius'):
+                    self._radii.extend(readAttribute(fr.drawing, 'radius', 'FLOAT', 'POINT'))
+                else: # not stored yet, every point has the default radius
+                    self._radii.extend([0.01] * (len(flat) // 3))
+
+        # projected lazily and again only when the view changes
+        self._grid = ScreenGrid(10)
+        self._grid.set_points(points, segments)
+        self._fill_tree = self._fill_view = None
+
+    def showsFill(self, gp, material_index):
+        if material_index >= len(gp.material_slots): return False
+        mat = gp.material_slots[material_index].material
+        return mat != None and mat.grease_pencil != None and mat.grease_pencil.show_fill
+
+    def fillTree(self, context): # R-tree over the screen boxes of filled strokes, rebuilt when the view changes
+        self._grid.update(context)
+        if self._fill_view != self._grid.view:
+            self._fill_view = self._grid.view
+            entries = []
+            for sdx, (drawing, idx, start, count, fill) in enumerate(self._strokes):
+                pts = self._grid.screen[start:start + count]
+                if not fill or None in pts: continue
+                xs = [ p[0] for p in pts ]
+                ys = [ p[1] for p in pts ]
+                entries.append( ((min(xs), min(ys), max(xs), max(ys)), sdx) )
+            self._fill_tree = boxTree(entries)
+        return self._fill_tree
+
+    def strokeAt(self, context, pos, fill):
+        """( stroke, point ) indices of the topmost stroke under pos and its point nearest to pos, or None.
+Fill looks for the fill area containing pos, otherwise the stroke line within 10 pixels.
+"""
+        if fill:
+            tree = self.fillTree(context)
+            screen = self._grid.screen
+            for sdx in sorted(boxTreeQuery(tree, (pos[0], pos[1], pos[0], pos[1])), reverse=True):
+                start, count = self._strokes[sdx][2:4]
+                if pointInPoly(pos[0], pos[1], [ p[:2] for p in screen[start:start + count] ]):
+                    pdx = min(range(start, start + count), key=lambda i: math.hypot(screen[i][0] - pos[0], screen[i][1] - pos[1]))
+                    return (sdx, pdx)
+            return None
+
+        found = self._grid.nearest_segment(context, pos, 10)
+        if found:
+            i, j = self._grid.segments[found[0]]
+            pdx = i if found[1] < 0.5 else j
+        else: # strokes of a single point have no segments
+            found = self._grid.nearest_index(context, pos, 10)
+            if found == None: return None
+            pdx = found[0]
+        return (self._point_strokes[pdx], pdx)
+
+    def sampleStroke(self, context, brush, sdx, pdx, fill): # copy a stroke's attributes to the brush
+        gp = context.active_object
+        drawing, idx, start, count, _ = self._strokes[sdx]
+        stroke = drawing.strokes[idx]
+        point = stroke.points[pdx - start]
+
+        clr = stroke.fill_color if fill else point.vertex_color
+        if clr[3] == 0 and stroke.material_index < len(gp.material_slots): # no vertex color, the material color shows
+            mat = gp.material_slots[stroke.material_index].material
+            if mat != None and mat.grease_pencil != None:
+                clr = mat.grease_pencil.fill_color if fill else mat.grease_pencil.color
+
+        brush.color = (to_hex(clr[0]), to_hex(clr[1]), to_hex(clr[2]))
+        brush.gpencil_settings.vertex_mode = 'FILL' if fill else 'STROKE'
+        brush.unprojected_radius = point.radius
+        brush.strength = point.opacity
+        brush.gpencil_settings.hardness = 1 - stroke.softness
         
     def modal(self, context, event):
-        context.area.tag_redraw()
+        # redraw only when the overlay changes, so the pixel cache survives until then
+        if event.ctrl or self._drawPoint or self.live_swatch:
+            context.area.tag_redraw()
         
-        if self._selectedPoint:
-            context.area.header_text_set(f"Radius: {self._selectedPoint.radius}")
+        if self._selectedRadius != None:
+            context.area.header_text_set(f"Radius: {self._selectedRadius}")
 
         if event.type in {'RIGHTMOUSE', 'ESC'}:
             context.area.header_text_set(None)
@@ -323,32 +801,40 @@ CTRL-Left click to sample a selected Point's radius
             self._handle = None
             return {'FINISHED'}
             
+        if event.type in {'WHEELUPMOUSE', 'WHEELDOWNMOUSE'}:
+            step = 2 if event.type == 'WHEELUPMOUSE' else -2
+            self.sample_size = min(max(self.sample_size + step, 1), 15)
+            self.sampleText(context)
+            return {'RUNNING_MODAL'}
+
+        if event.type in {'M', 'S'} and event.value == 'PRESS':
+            if event.type == 'M':
+                self.sample_median = not self.sample_median
+            else:
+                self.live_swatch = not self.live_swatch
+                context.area.tag_redraw()
+            self.sampleText(context)
+            return {'RUNNING_MODAL'}
+
         if event.type == "MOUSEMOVE" and event.ctrl:
-            gp = context.active_object
-            use_multiedit = ume = context.tool_settings.use_grease_pencil_multi_frame_editing        
-            strokes = [s for lr in gp.data.layers if not lr.lock and not lr.hide for fr in ([fr for fr in lr.frames if fr.select or fr == lr.current_frame()] if use_multiedit else [lr.current_frame()]) for s in fr.drawing.strokes]
-            self._selectedPoint = self._drawPoint = None
-            for stroke in strokes:
-                if self._selectedPoint:
-                    break
-                for p in stroke.points:
-                    p3d = (p.position[0], p.position[1], p.position[2])
-                    p2d = to2d(context, p3d)
-                    mouse_pos = (event.mouse_region_x, event.mouse_region_y)
-                    delta = Vector(mouse_pos) - Vector(p2d)
-                    if delta.length < 10:
-                        self._selectedPoint = p
-                        self._drawPoint = p2d
-                        break
+            self._selectedRadius = self._drawPoint = None
+            mouse_pos = (event.mouse_region_x, event.mouse_region_y)
+            found = self._grid.nearest_index(context, mouse_pos, 10)
+            if found:
+                self._selectedRadius = self._radii[found[0]]
+                self._drawPoint = found[1]
+        elif event.type == "MOUSEMOVE" and self.live_swatch:
+            self._swatch = self.samplePixel(context, event) or self._swatch
+            self._swatchPos = (event.mouse_region_x + 20, event.mouse_region_y + 20)
         
         if event.type == "LEFTMOUSE":
             C = bpy.context
             
             if event.ctrl:
-                if self._selectedPoint:
+                if self._selectedRadius != None:
                     brush = C.tool_settings.gpencil_paint.brush
                     if brush: 
-                        brush.unprojected_radius = self._selectedPoint.radius
+                        brush.unprojected_radius = self._selectedRadius
 
                         context.area.header_text_set(None)
                         context.workspace.status_text_set("")
@@ -363,8 +849,24 @@ CTRL-Left click to sample a selected Point's radius
                 brush = C.tool_settings.gpencil_vertex_paint.brush
             else:
                 brush = C.tool_settings.gpencil_paint.brush
+
+            if event.alt or self.sample_attributes:
+                if brush == None: return {'FINISHED'}
+                found = self.strokeAt(context, (event.mouse_region_x, event.mouse_region_y), not event.shift)
+                if found == None:
+                    return {'RUNNING_MODAL'}
+                self.sampleStroke(context, brush, found[0], found[1], not event.shift)
+
+                context.area.header_text_set(None)
+                context.workspace.status_text_set("")
+                bpy.types.SpaceView3D.draw_handler_remove(self._handle, 'WINDOW')
+                context.window.cursor_modal_restore()
+                self._handle = None
+                return {'FINISHED'}
                 
-            clr = getPixel(event.mouse_x, event.mouse_y)
+            clr = self.samplePixel(context, event)
+            if clr == None: # clicked on the swatch itself
+                return {'RUNNING_MODAL'}
             
             if brush == None: return {'FINISHED'}
 
@@ -386,7 +888,11 @@ CTRL-Left click to sample a selected Point's radius
 
     def execute(self, context):
         args = (context,)
-        context.workspace.status_text_set("LBUTTON = Fill color, SHIFT+LBUTTON = Stroke Color, CTRL = Sample a selected Point's radius")
+        context.workspace.status_text_set("LBUTTON = Fill color, SHIFT+LBUTTON = Stroke Color, CTRL = Sample a selected Point's radius, ALT = Copy stroke attributes, Wheel = sample size, M = median, S = swatch")
+        self._selectedRadius = self._drawPoint = None
+        self._swatch = self._swatchPos = None
+        self._sampler = PixelSampler()
+        self.init_points(context)
         self._handle = bpy.types.SpaceView3D.draw_handler_add(self.draw_callback_px, args, 'WINDOW', 'POST_PIXEL')
         context.window.cursor_modal_set("EYEDROPPER")
         context.window_manager.modal_handler_add(self)
@@ -399,8 +905,16 @@ class KnifeToolOperator(bpy.types.Operator):
     bl_idname = "quicktools.knifetool"
     bl_label = "Knife Tool"
 
+    all_layers : bpy.props.BoolProperty(name="All Layers", description="Cut every unlocked visible layer, and every selected frame with multi-frame editing", default=False)
+
     _start_mode = None
     _handle = None
+    _index_key = None
+    _drawings = []
+    _sizes = []
+    _cyclic = []
+    _stroke_tree = None
+    _bounds = None
     
     @classmethod
     def poll(self, context):
@@ -421,16 +935,10 @@ class KnifeToolOperator(bpy.types.Operator):
             lines.append(self.mousepos)
             
             # 50% alpha, 2 pixel width line
-            shader = gpu.shader.from_builtin('UNIFORM_COLOR')
+            self._overlay.update( (self.first, self.mousepos), [lines] )
             gpu.state.blend_set('ALPHA')
-            gpu.state.line_width_set(4.0)
-            batch = batch_for_shader(shader, 'LINE_STRIP', {"pos": lines})
-            shader.uniform_float("color", (0.0, 0.0, 0.0, 0.5))
-            batch.draw(shader)
-
-            gpu.state.line_width_set(2.0)
-            shader.uniform_float("color", (1.0, 1.0, 1.0, 0.5))
-            batch.draw(shader)
+            self._overlay.draw_lines( (0.0, 0.0, 0.0, 0.5), 4.0 )
+            self._overlay.draw_lines( (1.0, 1.0, 1.0, 0.5), 2.0 )
 
             # restore opengl defaults
             gpu.state.line_width_set(1.0)
@@ -476,63 +984,147 @@ class KnifeToolOperator(bpy.types.Operator):
                 if region.type == 'WINDOW':
                     break
                 
-            gp = context.active_object    
-            
-            for stroke in gp.data.layers.active.current_frame().drawing.strokes:
-                if len(stroke.points) < 2: continue
-            
-                idx = 0
-                cnt = len(stroke.points)
-                
-                while idx <  cnt:
-                    pt1 = stroke.points[idx + 0]
-                    pt2 = stroke.points[ (idx + 1) % cnt ]
-                    
-                    a1 = view3d_utils.region_2d_to_location_3d(context.region, context.space_data.region_3d, 
-                        (self.first[0], self.first[1]), (pt1.position))
-                    a2 = view3d_utils.region_2d_to_location_3d(context.region, context.space_data.region_3d, 
-                        (self.last[0], self.last[1]), (pt1.position))
-                        
-                    lineA_p1 = Vector((a1[0], a1[2]))
-                    lineA_p2 = Vector((a2[0], a2[2]))
-                        
-                    idx = idx + 1
-                    
-                    if idx == cnt and not stroke.cyclic:
-                        continue
-
-                    lineB_p1 = Vector((pt1.position[0], pt1.position[2]))
-                    lineB_p2 = Vector((pt2.position[0], pt2.position[2]))
+            # one lookup in the shared stroke index finds the strokes of every target drawing near the cut
+            self.strokeIndex(context)
+            candidates = {}
+            for ddx, sdx in boxTreeQuery(self._stroke_tree, self.cutBox(context)):
+                candidates.setdefault(ddx, []).append(sdx)
 
-                    intersect_point = mathutils.geometry.intersect_line_line_2d(lineA_p1, lineA_p2, lineB_p1, lineB_p2)
+            cut = False
+            for ddx, strokes in candidates.items():
+                sizes = self.cutDrawing(context, self._drawings[ddx], self._sizes[ddx], self._cyclic[ddx], numpy.array(sorted(strokes)))
+                cut = cut or not numpy.array_equal(sizes, self._sizes[ddx])
+                self._sizes[ddx] = sizes
 
-                    if intersect_point:
-                        
-                        stroke.add_points(1)
-                        cnt = len(stroke.points)
-                        idx = idx + 1
-                        
-                        for pdx in range(cnt - 1, idx - 1, -1):
-                            self.copyPoint(stroke.points[pdx - 1], stroke.points[pdx])
-                        
-                        self.copyPoint(stroke.points[idx - 2], stroke.points[idx -1])    
-                        stroke.points[idx - 1].position = Vector((intersect_point[0], 
-                            stroke.points[idx - 2].position[1], intersect_point[1]))
-                        stroke.points[idx - 1].select = True
+            if cut:
+                bpy.ops.ed.undo_push(message = 'Knife cut')
 
             self.first = None
+
+        elif event.type == 'A' and event.value == 'PRESS':
+            self.all_layers = not self.all_layers
+            self.statusText(context)
             
         return {'RUNNING_MODAL'}
     
 
-    def copyPoint(self, source_point, dest_point):
-        dest_point.select = source_point.select 
-        dest_point.delta_time = source_point.delta_time
-        dest_point.opacity = source_point.opacity
-        dest_point.radius = source_point.radius
-        dest_point.rotation = source_point.rotation
-        dest_point.vertex_color = source_point.vertex_color
-        dest_point.position = source_point.position
+    def cutLine(self, context, depth_location): # cut line unprojected onto the view plane through depth_location, as x, z
+        a1 = view3d_utils.region_2d_to_location_3d(context.region, context.space_data.region_3d, 
+            (self.first[0], self.first[1]), depth_location)
+        a2 = view3d_utils.region_2d_to_location_3d(context.region, context.space_data.region_3d, 
+            (self.last[0], self.last[1]), depth_location)
+        return (a1[0], a1[2], a2[0], a2[2])
+
+    def targetDrawings(self, context):
+        gp = context.active_object
+        if not self.all_layers:
+            frame = gp.data.layers.active.current_frame()
+            return [frame.drawing] if frame else []
+
+        use_multiedit = context.tool_settings.use_grease_pencil_multi_frame_editing
+        drawings = {}
+        for lr in gp.data.layers:
+            if lr.lock or lr.hide:
+                continue
+            frames = [fr for fr in lr.frames if fr.select or fr == lr.current_frame()] if use_multiedit else [lr.current_frame()]
+            for fr in frames:
+                if fr != None:
+                    drawings[fr.drawing.as_pointer()] = fr.drawing
+        return list(drawings.values())
+
+    def strokeIndex(self, context):
+        """R-tree over the x/z boxes of the strokes of all target drawings.
+Cuts only insert points on existing segments, so boxes and stroke indices stay valid until the targets change.
+"""
+        drawings = self.targetDrawings(context)
+        key = tuple(drawing.as_pointer() for drawing in drawings)
+        if key == self._index_key:
+            return
+        self._index_key = key
+        self._drawings = drawings
+        self._sizes = []
+        self._cyclic = []
+
+        entries = []
+        lo = numpy.full(3, numpy.inf)
+        hi = numpy.full(3, -numpy.inf)
+        for ddx, drawing in enumerate(drawings):
+            strokes = [ (len(s.points), s.cyclic) for s in drawing.strokes ]
+            sizes = numpy.array([ cnt for cnt, _ in strokes ], dtype=numpy.int64)
+            self._sizes.append(sizes)
+            self._cyclic.append(numpy.array([ c for _, c in strokes ], dtype=bool))
+            positions = attributeArray(drawing, 'position')
+            if len(positions) == 0: continue
+            lo = numpy.minimum(lo, positions.min(axis=0))
+            hi = numpy.maximum(hi, positions.max(axis=0))
+            for sdx, box in enumerate(strokeBoxes(positions, sizes).tolist()):
+                if sizes[sdx] > 1:
+                    entries.append( (tuple(box), (ddx, sdx)) )
+        self._stroke_tree = boxTree(entries)
+        self._bounds = (lo, hi)
+
+    def cutBox(self, context): # x/z box of the cut line across the depth range of all target points
+        lo, hi = self._bounds
+        if not numpy.isfinite(lo).all():
+            return (0, 0, 0, 0)
+        view_dir = numpy.array(context.space_data.region_3d.view_rotation @ Vector((0.0, 0.0, -1.0)))
+        corners = numpy.array([ (x, y, z) for x in (lo[0], hi[0]) for y in (lo[1], hi[1]) for z in (lo[2], hi[2]) ])
+        depth = corners @ view_dir
+
+        # lines at intermediate depths lie between the nearest and farthest one
+        ends = numpy.array([ self.cutLine(context, corners[idx]) for idx in (depth.argmin(), depth.argmax()) ])
+        return ( min(ends[:, 0].min(), ends[:, 2].min()), min(ends[:, 1].min(), ends[:, 3].min()),
+            max(ends[:, 0].max(), ends[:, 2].max()), max(ends[:, 1].max(), ends[:, 3].max()) )
+
+    def cutDrawing(self, context, drawing, sizes, cyclic, candidates):
+        """Cut the candidate strokes of a drawing and return the new stroke sizes.
+Every crossing is found first, then the cut strokes are rebuilt in one pass.
+"""
+        positions = attributeArray(drawing, 'position').astype(numpy.float64)
+        starts = numpy.cumsum(sizes) - sizes
+        live = candidates[sizes[candidates] > 1]
+        if len(live) == 0: return sizes
+
+        # segments of the candidate strokes, the closing one included for cyclic strokes
+        counts = sizes[live] - 1 + cyclic[live]
+        seg_stroke = numpy.repeat(live, counts)
+        local = numpy.arange(counts.sum()) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+        i = starts[seg_stroke] + local
+        j = starts[seg_stroke] + (local + 1) % sizes[seg_stroke]
+
+        # the cut line only depends on the depth of the plane it is unprojected onto
+        view_dir = numpy.array(context.space_data.region_3d.view_rotation @ Vector((0.0, 0.0, -1.0)))
+        planes, first, inverse = numpy.unique(positions[i] @ view_dir, return_index=True, return_inverse=True)
+        lines = numpy.array([ self.cutLine(context, positions[i[idx]]) for idx in first ])[inverse.ravel()]
+
+        # all segments against the cut line at once
+        ax, az = lines[:, 0], lines[:, 1]
+        dax, daz = lines[:, 2] - ax, lines[:, 3] - az
+        bx, bz = positions[i, 0], positions[i, 2]
+        dbx, dbz = positions[j, 0] - bx, positions[j, 2] - bz
+        denom = dax * dbz - daz * dbx
+        parallel = denom == 0
+        denom[parallel] = 1
+        t = ((bx - ax) * dbz - (bz - az) * dbx) / denom
+        u = ((bx - ax) * daz - (bz - az) * dax) / denom
+        hit = numpy.flatnonzero(~parallel & (t >= 0) & (t <= 1) & (u >= 0) & (u <= 1))
+        if len(hit) == 0: return sizes
+
+        inserts = {}
+        for idx in hit: # ascending, so grouped by stroke and ordered along it
+            pos = (ax[idx] + dax[idx] * t[idx], positions[i[idx], 1], az[idx] + daz[idx] * t[idx])
+            inserts.setdefault(int(seg_stroke[idx]), []).append( (int(local[idx]), tuple(float(v) for v in pos)) )
+
+        select_domain = 'CURVE' if context.scene.tool_settings.gpencil_selectmode_edit == 'STROKE' else 'POINT'
+        insertStrokePoints(drawing, sizes.tolist(), inserts, select_domain)
+        sizes = sizes.copy()
+        for sdx, hits in inserts.items():
+            sizes[sdx] += len(hits)
+        return sizes
+
+    def statusText(self, context):
+        layers = "All layers" if self.all_layers else "Active layer"
+        context.workspace.status_text_set(f"Knife Tool: Click and drag cut lines: A = toggle all layers ({layers}): Right click to finish.")
 
 
     def invoke(self, context, event):
@@ -546,11 +1138,13 @@ class KnifeToolOperator(bpy.types.Operator):
 
             self.first = None
             self.mousepos = None
+            self._overlay = OverlayBatch()
             self._start_mode = bpy.context.active_object.mode
             bpy.ops.object.mode_set(mode='EDIT')
             bpy.ops.grease_pencil.set_selection_mode(mode='POINT')
             
-            context.workspace.status_text_set("Knife Tool: Click and drag cut lines: Right click to finish.")
+            self._index_key = None
+            self.statusText(context)
             
             context.window_manager.modal_handler_add(self)
             return {'RUNNING_MODAL'}
@@ -578,6 +1172,13 @@ Brush color is used as the FILL color, secondary_color is used as the STROKE col
     shift_pressed = False
     selectedPoint = None
     _handle = None
+    _snap_grid = None
+    _snap_dirty = False
+    _snap_positions = None # float32 copy of startend_points, compared against the drawings after an update
+    _gp_uid = None
+    _depsgraph_handler = None
+    _path_overlay = None
+    _band_overlay = None
   
     @classmethod
     def poll(self, context):
@@ -588,20 +1189,52 @@ Brush color is used as the FILL color, secondary_color is used as the STROKE col
         return (context.active_object and context.active_object.type == 'GREASEPENCIL')
 
     
-    def init_startendpoints(self, context): # create array of start and end points of all visible strokes
-        gp = context.active_object
-        
+    def snapDrawings(self, context): # drawings of the visible layers' keyframes at the current frame
+        return [ fr.drawing for lr in context.active_object.data.layers if not lr.hide and not lr.lock
+            for fr in lr.frames if fr.frame_number == context.scene.frame_current ]
+
+    def init_startendpoints(self, context): # create array of points of all visible strokes as plain tuples
         self.startend_points.clear()
+        segments = []
         
-        for lr in gp.data.layers:
-            if lr.hide or lr.lock:
-                continue
-            for fr in lr.frames:
-                if fr.frame_number == context.scene.frame_current:
-                    for s in fr.drawing.strokes:
-                        if len(s.points) > 0:
-                            for p in s.points:
-                                self.startend_points.append(p)
+        for drawing in self.snapDrawings(context):
+            base = len(self.startend_points)
+            for n, cyclic in [ (len(s.points), s.cyclic) for s in drawing.strokes ]:
+                segments.extend(strokeSegments(base, n, cyclic))
+                base += n
+            flat = readAttribute(drawing, 'position', 'FLOAT_VECTOR', 'POINT')
+            self.startend_points.extend(zip(flat[0::3], flat[1::3], flat[2::3]))
+
+        self._snap_grid.set_points(self.startend_points, segments)
+        self._snap_positions = numpy.array(self.startend_points, dtype=numpy.float32).reshape(-1, 3)
+        self._snap_dirty = False
+
+    def snap_changed(self, context):
+        """True if the drawings no longer hold exactly the snap points, however many updates came in between"""
+        arrays = [ attributeArray(drawing, 'position') for drawing in self.snapDrawings(context) ]
+        positions = numpy.concatenate(arrays) if arrays else numpy.zeros((0, 3), dtype=numpy.float32)
+        if positions.shape != self._snap_positions.shape:
+            return True
+        # added strokes sit at the end of their own drawing, not of the list, so compare in sorted order
+        return not numpy.array_equal(positions[numpy.lexsort(positions.T)], self._snap_positions[numpy.lexsort(self._snap_positions.T)])
+
+    def on_depsgraph(self, scene, depsgraph): # flag updates of this grease pencil, MOUSEMOVE checks if they came from outside
+        for update in depsgraph.updates:
+            if update.id.session_uid == self._gp_uid:
+                self._snap_dirty = True
+                return
+
+    def remove_handlers(self):
+        if self._handle:
+            bpy.types.SpaceView3D.draw_handler_remove(self._handle, 'WINDOW')
+            self._handle = None
+        if self._depsgraph_handler in bpy.app.handlers.depsgraph_update_post:
+            bpy.app.handlers.depsgraph_update_post.remove(self._depsgraph_handler)
+        self._depsgraph_handler = None
+
+    def cancel(self, context): # modal cancelled by Blender, e.g. on file load
+        self.remove_handlers()
+        context.window.cursor_modal_restore()
 
 
     def draw_callback_px(self, context):
@@ -621,31 +1254,25 @@ Brush color is used as the FILL color, secondary_color is used as the STROKE col
 
         gpu.state.line_width_set(lw)
         
-        pt = []
-        
         if len(self.mouse_path) == 0:
             return
         
-        for p in self.mouse_path:
-            pt.append(to2d(context, p))
-            
+        # the path is only reprojected when it or the view changes, the rubber band follows the mouse
+        view = viewKey(context.region, context.space_data.region_3d)
+        path = tuple(tuple(p) for p in self.mouse_path)
+        self._path_overlay.update( (view, path), [[ to2d(context, p) for p in path ]] )
+        band = [ to2d(context, path[-1]) ]
         if self.mouse_pos:
-            pt.append(self.mouse_pos)
-        
-        shader = gpu.shader.from_builtin('UNIFORM_COLOR')
+            band.append(self.mouse_pos)
+        self._band_overlay.update( (view, path[-1], self.mouse_pos), [band] )
+
         gpu.state.blend_set('ALPHA')
-        batch = batch_for_shader(shader, 'LINE_STRIP', {"pos": pt})
-        
-        gpu.state.line_width_set(4.0)
-        shader.uniform_float("color", (0.0, 0.0, 0.0, 1.0))
-        batch.draw(shader)
-        
-        gpu.state.line_width_set(2.0)
-        shader.uniform_float("color", (0.7, 0.7, 0.7, 0.5))
-        batch.draw(shader)
-        
-        for p in self.mouse_path:
-            draw_circle_2d(to2d(context, p), (0.3, 0.3, 0.3, 1), 2)
+        for overlay in (self._path_overlay, self._band_overlay):
+            overlay.draw_lines( (0.0, 0.0, 0.0, 1.0), 4.0 )
+        for overlay in (self._path_overlay, self._band_overlay):
+            overlay.draw_lines( (0.7, 0.7, 0.7, 0.5), 2.0 )
+        self._path_overlay.draw_points( (0.3, 0.3, 0.3, 1), 5.0 )
+        gpu.state.line_width_set(lw)
 
         
     def modal(self, context, event):
@@ -678,6 +1305,11 @@ Brush color is used as the FILL color, secondary_color is used as the STROKE col
             
         if event.type == "MOUSEMOVE":
             self.selectedPoint = None
+
+            if self._snap_dirty:
+                self._snap_dirty = False
+                if self.snap_changed(context):
+                    self.init_startendpoints(context)
             
             if len(self.mouse_path) > 2:
                 p2d = to2d(context, self.mouse_path[0])
@@ -692,20 +1324,21 @@ Brush color is used as the FILL color, secondary_color is used as the STROKE col
             if self.close:
                 context.window.cursor_modal_set("DOT")
             else:
-                for p in self.startend_points:
-                    p3d = (p.position[0], p.position[1], p.position[2])
-                    p2d = to2d(context, p3d)
-                    delta = Vector(self.mouse_pos) - Vector(p2d)
+                # vertices first, then segment crossings, then the nearest point on a segment
+                snap = self._snap_grid.nearest(context, self.mouse_pos, self.pixels)
+                if snap == None:
+                    snap = self._snap_grid.nearest_intersection(context, self.mouse_pos, self.pixels)
+                on_segment = False
+                if snap == None:
+                    snap = self._snap_grid.nearest_on_segment(context, self.mouse_pos, self.pixels)
+                    on_segment = True
+                if snap:
+                    self.selectedPoint, self.drawPoint = snap
+                    context.window.cursor_modal_set("PAINT_CROSS")
                     
-                    if delta.length < self.pixels:
-                        self.selectedPoint = p3d
-                        self.drawPoint = p2d
-                        context.window.cursor_modal_set("PAINT_CROSS")
-                        
-                        if self.shift_pressed: 
-                            if self.mouse_path.count(self.selectedPoint) == 0:
-                                self.mouse_path.append(self.selectedPoint)
-                        break
+                    if self.shift_pressed and not on_segment: 
+                        if self.mouse_path.count(self.selectedPoint) == 0:
+                            self.mouse_path.append(self.selectedPoint)
                     
                 if self.selectedPoint == None:
                     context.window.cursor_modal_set("CROSSHAIR")
@@ -751,7 +1384,7 @@ Brush color is used as the FILL color, secondary_color is used as the STROKE col
 
         elif event.type in {'RIGHTMOUSE', 'ESC'}:
             context.window.cursor_modal_restore()
-            bpy.types.SpaceView3D.draw_handler_remove(self._handle, 'WINDOW')
+            self.remove_handlers()
             context.area.tag_redraw()
             return {'FINISHED'}
 
@@ -813,7 +1446,13 @@ Brush color is used as the FILL color, secondary_color is used as the STROKE col
             if stroke.fill_opacity == 0: 
                 stroke.fill_opacity = 1
 
-        self.init_startendpoints(context)
+        # only the new stroke's points become snap candidates, the depsgraph updates it causes then match them
+        added = [ (pt[0], pt[1], pt[2]) for pt in self.mouse_path ]
+        segments = strokeSegments(len(self.startend_points), len(added), self.close)
+        self.startend_points.extend(added)
+        self._snap_grid.add_points(added, segments)
+        self._snap_positions = numpy.concatenate( (self._snap_positions, numpy.array(added, dtype=numpy.float32).reshape(-1, 3)) )
+
         self.mouse_path.clear()
         self.selectedPoint = None
         self.drawPoint = None
@@ -837,6 +1476,9 @@ Brush color is used as the FILL color, secondary_color is used as the STROKE col
         self.mouse_path.clear()
         self.pixels = 10
         self.close = False
+        self._snap_grid = ScreenGrid(self.pixels)
+        self._path_overlay = OverlayBatch()
+        self._band_overlay = OverlayBatch()
 
         gp = context.active_object
         if gp.data.layers.active.lock == True or gp.data.layers.active.hide == True: 
@@ -847,6 +1489,9 @@ Brush color is used as the FILL color, secondary_color is used as the STROKE col
 
         if context.area.type == 'VIEW_3D':
             self._handle = bpy.types.SpaceView3D.draw_handler_add(self.draw_callback_px, (context,), 'WINDOW', 'POST_PIXEL')                    
+            self._gp_uid = gp.data.session_uid
+            self._depsgraph_handler = self.on_depsgraph
+            bpy.app.handlers.depsgraph_update_post.append(self._depsgraph_handler)
             context.window_manager.modal_handler_add(self)
             context.window.cursor_modal_set("CROSSHAIR")
             return {'RUNNING_MODAL'}
@@ -867,6 +1512,9 @@ class quickSubMergeOperator(bpy.types.Operator):
     bl_label = "SubMerge Stroke"
     bl_options = {'REGISTER', 'UNDO'}
 
+    preview_only : bpy.props.BoolProperty(name="Preview Only", description="Draw the respaced points as an overlay while adjusting and only change the strokes on click", default=True)
+    update_rate : bpy.props.IntProperty(name="Update Rate", description="Updates per second while adjusting, 0 updates once per redraw", default=0, min=0, max=240)
+
     _submerge_interval = 0.001
     _submerge_spacing = 0.00
     
@@ -874,7 +1522,12 @@ class quickSubMergeOperator(bpy.types.Operator):
     _init_sculpt_mask_point = 0
     _init_sculpt_mask_stroke = 0
     _mouse_start = None
-    _startend = []
+    _snapshots = []
+    _results = []
+    _results_spacing = None # spacing _results were resampled at, the throttle lets _submerge_spacing run ahead
+    _overlay = None
+    _handle = None
+    _throttle = None
     _lbuttondown = False
     _refresh = False
     _dragging = False
@@ -883,38 +1536,86 @@ class quickSubMergeOperator(bpy.types.Operator):
     def poll(self, context):
         if context.active_object == None or context.active_object.type != 'GREASEPENCIL': return False
         return (context.mode == 'SCULPT_GREASE_PENCIL' or context.mode == 'EDIT_GREASE_PENCIL')
+
+    def refresh(self, context):
+        self._throttle.take()
+        self.subdivide_and_merge()
+        context.scene['submerge_spacing'] = self._submerge_spacing
+        context.area.header_text_set("SubMerge Spacing: %.4f" % self._submerge_spacing + self._throttle.rate_text())
+        context.area.tag_redraw()
     
     def subdivide_and_merge(self):
-        bpy.ops.ed.undo_push(message = "Subdivide and Merge")
-    
-        idx = 5
-        
-        while idx > 0:    
-            bpy.ops.grease_pencil.stroke_subdivide(number_cuts = 1, only_selected = True)
-            bpy.ops.grease_pencil.stroke_merge_by_distance(threshold=0.005)
-            idx = idx - 1
+        # respace selected points by arc length from the original strokes, end points stay where they are
+        self._results = []
+        self._results_spacing = self._submerge_spacing
+        for drawing, snapshot, matrix in self._snapshots:
+            sizes, arrays = snapshot.resample(self._submerge_spacing)
+            if self.preview_only: # only drawn until the click applies it
+                self._results.append( (drawing, snapshot, matrix, sizes, arrays) )
+            else:
+                snapshot.apply(drawing, sizes, arrays)
+
+    def apply_preview(self):
+        for drawing, snapshot, matrix, sizes, arrays in self._results:
+            snapshot.apply(drawing, sizes, arrays)
+        self._results = []
+
+    def draw_callback_view(self, context):
+        if len(self._results) == 0: return
+
+        # batches are rebuilt only when the spacing changes, in world space as layers may be transformed
+        if self._overlay.key != self._results_spacing:
+            strips = []
+            for drawing, snapshot, matrix, sizes, arrays in self._results:
+                positions = (arrays['position'] @ matrix[:3, :3].T + matrix[:3, 3]).tolist()
+                starts = numpy.cumsum(snapshot.sizes) - snapshot.sizes
+                new_starts = numpy.cumsum(sizes) - sizes
+                for sdx in numpy.flatnonzero(snapshot.sizes > 0):
+                    if not snapshot.selected[starts[sdx]:starts[sdx] + snapshot.sizes[sdx]].any(): continue
+                    strip = positions[new_starts[sdx]:new_starts[sdx] + sizes[sdx]]
+                    if snapshot.cyclic[sdx] and len(strip) > 2:
+                        strip.append(strip[0])
+                    strips.append(strip)
+            self._overlay.update(self._results_spacing, strips)
 
-        bpy.ops.grease_pencil.stroke_merge_by_distance(threshold=self._submerge_spacing)
+        gpu.state.blend_set('ALPHA')
+        self._overlay.draw_lines( (0.0, 0.0, 0.0, 0.5), 1.0 )
+        self._overlay.draw_points( (1.0, 0.6, 0.0, 1.0), 5.0 )
+        gpu.state.blend_set('NONE')
+        gpu.state.point_size_set(1.0)
+        gpu.state.line_width_set(1.0)
 
-        # restore start and end point positions
-        idx = 0
-        gp = bpy.context.active_object
+    def remove_preview(self, context):
+        if self._handle:
+            bpy.types.SpaceView3D.draw_handler_remove(self._handle, 'WINDOW')
+            self._handle = None
+        if self._throttle:
+            self._throttle.stop(context)
+            self._throttle = None
+        context.area.tag_redraw()
+
+    def take_snapshots(self, context):
+        self._snapshots = []
+        gp = context.active_object
         for layer in gp.data.layers:
             if layer.hide == True or layer.lock == True: continue
             fr = layer.current_frame()
             if fr == None: continue
-            for stroke in fr.drawing.strokes:
-                if stroke.select and not stroke.cyclic:
-                    pos = self._startend[idx]
-                    stroke.points[0].position = pos[0]
-                    stroke.points[-1].position = pos[1]
-                    idx = idx + 1
+            snapshot = StrokeSnapshot(fr.drawing)
+            if snapshot.selected.any():
+                # preview points go to world space through the object and the layer transform
+                self._snapshots.append( (fr.drawing, snapshot, numpy.array(gp.matrix_world @ layer.matrix_local)) )
                     
 
     def modal(self, context, event):
         if event.type in {'RIGHTMOUSE', 'ESC'}:
             context.area.header_text_set(None)
-            bpy.ops.ed.undo()
+            if not self.preview_only:
+                for drawing, snapshot, matrix in self._snapshots:
+                    snapshot.restore(drawing)
+            self._snapshots = []
+            self._results = []
+            self.remove_preview(context)
 
             context.window.cursor_modal_restore()
             context.scene.tool_settings.gpencil_selectmode_edit = self._init_select_mode   
@@ -930,8 +1631,12 @@ class quickSubMergeOperator(bpy.types.Operator):
             self._lbuttondown = False
 
             if  not self._dragging:
+                if self._throttle.pending: self.refresh(context)
                 context.area.header_text_set(None)
                 context.scene['submerge_spacing'] = self._submerge_spacing
+                self.apply_preview()
+                self.remove_preview(context)
+                self._snapshots = [] # the operator's undo step records the result
                 
                 context.window.cursor_modal_restore()
 
@@ -958,12 +1663,6 @@ class quickSubMergeOperator(bpy.types.Operator):
             if self._submerge_spacing < 0: self._submerge_spacing = 0
             self._refresh = True
 
-        if self._refresh == True:
-            bpy.ops.ed.undo()
-            self.subdivide_and_merge()
-            context.scene['submerge_spacing'] = self._submerge_spacing
-            self._refresh = False
-       
         if event.type == 'MOUSEMOVE' and self._lbuttondown:
             if (event.mouse_prev_x != event.mouse_x or  event.mouse_prev_y != event.mouse_y):
                 self._dragging = True
@@ -972,20 +1671,17 @@ class quickSubMergeOperator(bpy.types.Operator):
                 self._mouse_start = (event.mouse_x, event.mouse_y)
                 self._refresh = True
 
+        # events only move the spacing, the resample runs once per redraw or at the update rate
+        if self._refresh == True:
+            self._throttle.request()
+            self._refresh = False
+
+        if self._throttle.ready():
+            self.refresh(context)
+
         return {'RUNNING_MODAL'}    
     
     def execute(self, context):
-        # remember start and end point positions of open strokes
-        self._startend.clear()
-        gp = context.active_object
-        for layer in gp.data.layers:
-            if layer.hide == True or layer.lock == True: continue
-            fr = layer.current_frame()
-            if fr == None: continue
-            for stroke in fr.drawing.strokes:
-                if stroke.select and not stroke.cyclic:
-                    self._startend.append((stroke.points[0].position, stroke.points[-1].position))
-            
         # save select mode state and set mode to POINT to see point spacing
         self._init_select_mode = context.scene.tool_settings.gpencil_selectmode_edit
         self._init_sculpt_mask_point = context.scene.tool_settings.use_gpencil_select_mask_point
@@ -994,7 +1690,7 @@ class quickSubMergeOperator(bpy.types.Operator):
         context.scene.tool_settings.gpencil_selectmode_edit = 'POINT'
         context.scene.tool_settings.use_gpencil_select_mask_point = True
 
-        bpy.ops.ed.undo_push(message = "SubMerge Stroke")
+        self.take_snapshots(context)
 
         self._submerge_spacing = context.scene.get('submerge_spacing')
         if not self._submerge_spacing: self._submerge_spacing = 0.0
@@ -1002,12 +1698,24 @@ class quickSubMergeOperator(bpy.types.Operator):
         context.area.header_text_set("SubMerge Spacing: %.4f" % self._submerge_spacing)
         
         self.subdivide_and_merge()
+        self._throttle = RefreshThrottle(self.update_rate)
+        self._throttle.start(context)
+        if self.preview_only:
+            self._overlay = OverlayBatch()
+            self._handle = bpy.types.SpaceView3D.draw_handler_add(self.draw_callback_view, (context,), 'WINDOW', 'POST_VIEW')
 
         context.window_manager.modal_handler_add(self)
         context.window.cursor_modal_set("SCROLL_Y")
         
         return {'RUNNING_MODAL'}
 
+    def cancel(self, context): # modal cancelled by Blender, e.g. on file load, the drawings may be gone
+        self._snapshots = []
+        self._results = []
+        self.remove_preview(context)
+        context.area.header_text_set(None)
+        context.window.cursor_modal_restore()
+
 
 class quickToggleFullScreenOperator(bpy.types.Operator):
     """Make view fullscreen. 
@@ -1215,6 +1923,10 @@ class QuickSelectPointsOperator(bpy.types.Operator):
             return {'FINISHED'}
 
 
+HARDNESS_DOMAINS = { 'radius' : 'POINT', 'opacity' : 'POINT', 'rotation' : 'POINT', 'softness' : 'CURVE', 'fill_opacity' : 'CURVE' }
+HARDNESS_MODES = { 'fill_opacity' : ("Fill Opacity", 0, 1), 'opacity' : ("Opacity", 0, 1), 'radius' : ("Radius", 0, None),
+    'rotation' : ("Rotation", None, None), 'softness' : ("Hardness", 0, 1) }
+
 class quickHardnessOperator(bpy.types.Operator):
     """Middle mouse to adjust selected strokes' hardness.
 Hold CTRL to adjust selected points' radius.
@@ -1226,8 +1938,13 @@ Left click to apply"""
     bl_idname = "quicktools.hardness"
     bl_label = "Stroke Hardness/Radius/Opacity"
     bl_options = {'REGISTER', 'UNDO'}
-    selected_points = []
-    selected_strokes = []
+
+    update_rate : bpy.props.IntProperty(name="Update Rate", description="Updates per second while adjusting, 0 updates once per redraw", default=0, min=0, max=240)
+
+    _throttle = None
+    _mode = None
+    _targets = [] # ( drawing, point mask, stroke mask, stroke sizes )
+    _snapshots = {}
     _interval = 0
     _direction = 0
     _mouse_start = None
@@ -1241,16 +1958,91 @@ Left click to apply"""
         return context.mode == 'SCULPT_GREASE_PENCIL' or (context.mode == 'EDIT_GREASE_PENCIL' and \
             context.workspace.tools.from_space_view3d_mode(context.mode).idname == 'builtin.select_box')
     
-    def get_selected_points(self, context):
-        if context.active_object == None or context.active_object.type != 'GREASEPENCIL':
-            return []
-        return [ p for lr in context.active_object.data.layers if not lr.lock and not lr.hide for s in lr.current_frame().drawing.strokes 
-            if s.select for p in s.points if p.select]
-            
-    def get_selected_strokes(self, context):
+    def get_targets(self, context):
+        """( drawing, point mask, stroke mask, stroke sizes ) of the current frames of unlocked layers.
+Points count on visible layers only, as selected points of selected strokes.
+"""
         gp = context.active_object
-        
-        return [s for lr in gp.data.layers if not lr.lock for s in lr.current_frame().drawing.strokes if s.select]
+        active = gp.data.layers.active.current_frame() if gp.data.layers.active else None
+        targets = []
+        for lr in gp.data.layers:
+            fr = lr.current_frame()
+            if lr.lock or fr == None: continue
+            drawing = fr.drawing
+            strokes = [ (len(s.points), s.select) for s in drawing.strokes ]
+            sizes = numpy.array([ n for n, _ in strokes ], dtype=numpy.int64)
+            stroke_mask = numpy.array([ sel for _, sel in strokes ], dtype=bool)
+
+            point_mask = numpy.zeros(int(sizes.sum()), dtype=bool)
+            sel = drawing.attributes.get('.selection')
+            if not lr.hide:
+                if sel != None and sel.domain == 'POINT':
+                    point_mask = attributeArray(drawing, '.selection')[:, 0] & numpy.repeat(stroke_mask, sizes)
+                else: # stroke selection or none stored, every point of a selected stroke
+                    point_mask = numpy.repeat(stroke_mask, sizes)
+
+            if stroke_mask.any() or (fr == active):
+                targets.append( (drawing, point_mask, stroke_mask, sizes) )
+        return targets
+
+    def snapshot(self, name):
+        """[ ( original, current ) ] arrays of an attribute per target, read the first time it is adjusted"""
+        if name not in self._snapshots:
+            domain = HARDNESS_DOMAINS[name]
+            entries = []
+            for drawing, point_mask, stroke_mask, sizes in self._targets:
+                if drawing.attributes.get(name) != None:
+                    original = attributeArray(drawing, name)[:, 0]
+                else: # not stored yet, every element has the default
+                    count = len(point_mask) if domain == 'POINT' else len(stroke_mask)
+                    original = numpy.full(count, ATTRIBUTE_DEFAULTS.get(name, 0), dtype=numpy.float32)
+                entries.append( (original, original.copy()) )
+            self._snapshots[name] = entries
+        return self._snapshots[name]
+
+    def adjust(self, context, name, delta, lo, hi):
+        """Add delta to an attribute of every selected element in one NumPy op per drawing, returns the first new value"""
+        domain = HARDNESS_DOMAINS[name]
+        active = context.active_object.data.layers.active.current_frame()
+        first = None
+        for (drawing, point_mask, stroke_mask, sizes), (original, current) in zip(self._targets, self.snapshot(name)):
+            mask = point_mask if domain == 'POINT' else stroke_mask
+            if name == 'fill_opacity' and active != None and drawing == active.drawing: 
+                current[current == 0] = 1 # bug in Blender v4.3+ does not initialize fill_opacity = 1
+            elif not mask.any():
+                continue
+            values = current[mask] + delta
+            # numpy before 2.0 refuses clip without any bound, rotation has none
+            current[mask] = values if lo == None and hi == None else numpy.clip(values, lo, hi)
+            if drawing.attributes.get(name) == None:
+                drawing.attributes.new(name, 'FLOAT', domain)
+            setAttributeArray(drawing, name, current)
+            if first == None and mask.any():
+                first = float(current[mask][0])
+        context.active_object.data.update_tag()
+        return first
+
+    def restore(self, context):
+        for name, entries in self._snapshots.items():
+            for (drawing, point_mask, stroke_mask, sizes), (original, current) in zip(self._targets, entries):
+                if drawing.attributes.get(name) != None:
+                    setAttributeArray(drawing, name, original)
+        self._snapshots = {}
+        context.active_object.data.update_tag()
+
+    def mode(self, event):
+        if event.shift and event.ctrl: return 'fill_opacity'
+        if event.shift: return 'opacity'
+        if event.ctrl: return 'radius'
+        if event.alt: return 'rotation'
+        return 'softness'
+
+    def refresh(self, context):
+        """Apply the deltas summed since the last refresh"""
+        label, lo, hi = HARDNESS_MODES[self._mode]
+        context.space_data.overlay.use_gpencil_edit_lines=False
+        value = self.adjust(context, self._mode, self._throttle.take(), lo, hi)
+        if value != None: context.area.header_text_set("%s: %.4f" % (label, value) + self._throttle.rate_text())
 
     def modal(self, context, event):
 
@@ -1260,14 +2052,18 @@ Left click to apply"""
             context.space_data.overlay.use_gpencil_edit_lines=True
             
             if not self._dragging:
+                if self._throttle.pending: self.refresh(context)
+                context.space_data.overlay.use_gpencil_edit_lines=True
+                self._throttle.stop(context)
                 context.area.header_text_set(None)
                 context.window.cursor_modal_restore()
 
                 return {'FINISHED'}
 
         if event.type in {'RIGHTMOUSE', 'ESC'}:
+            self._throttle.stop(context)
             context.area.header_text_set(None)
-            bpy.ops.ed.undo()
+            self.restore(context)
 
             context.window.cursor_modal_restore()
 
@@ -1315,63 +2111,33 @@ Left click to apply"""
 
         if self._refresh == True:
             self._refresh = False
-            context.space_data.overlay.use_gpencil_edit_lines=False
-            
-            if event.shift and event.ctrl:
-                for s in context.active_object.data.layers.active.current_frame().drawing.strokes:
-                    if s.fill_opacity == 0: s.fill_opacity = 1
-                for s in self.selected_strokes:
-                    opacity = s.fill_opacity + self._interval 
-                    opacity = min(max(opacity, 0), 1)
-                    s.fill_opacity = opacity
-                if len(self.selected_strokes) > 0:
-                    s = self.selected_strokes[0]
-                    context.area.header_text_set("Fill Opacity: %.4f" % s.fill_opacity)
-            elif event.shift:
-                sp = None
-                for p in self.selected_points:
-                    opacity = p.opacity + self._interval
-                    opacity = min(max(opacity, 0), 1)
-                    p.opacity = opacity
-                    if sp == None: sp = p
-                if sp: context.area.header_text_set("Opacity: %.4f" % sp.opacity)
-            elif event.ctrl:
-                sp = None
-                for p in self.selected_points:
-                    radius = p.radius + self._interval
-                    radius = max(radius, 0)
-                    p.radius = radius
-                    if sp == None: sp = p
-                if sp: context.area.header_text_set("Radius: %.4f" % sp.radius)
-            elif event.alt:
-                sp = None
-                for p in self.selected_points:
-                    rotation = p.rotation + self._interval
-                    p.rotation = rotation
-                    if sp == None: sp = p
-                if sp: context.area.header_text_set("Rotation: %.4f" % sp.rotation)
-            else:
-                for s in self.selected_strokes:
-                    softness = s.softness + self._interval
-                    softness = min(max(softness, 0), 1)
-                    s.softness = softness
-                if len(self.selected_strokes) > 0:
-                    s = self.selected_strokes[0]
-                    context.area.header_text_set("Hardness: %.4f" % s.softness)
+            mode = self.mode(event)
+            if self._throttle.pending and mode != self._mode: # deltas of another attribute go there first
+                self.refresh(context)
+            self._mode = mode
+            self._throttle.request(self._interval)
+
+        # deltas of the events in between are summed, the attribute is written once per redraw or at the update rate
+        if self._throttle.ready():
+            self.refresh(context)
         
         return {'RUNNING_MODAL'}
                 
     
     def execute(self, context):
-        bpy.ops.ed.undo_push(message = quickHardnessOperator.bl_label)
-        self.selected_points = self.get_selected_points(context)    
-        self.selected_strokes = self.get_selected_strokes(context)    
+        # attribute arrays are captured on first use and written back on cancel
+        self._targets = self.get_targets(context)
+        self._snapshots = {}
+        self._mode = None
+        self._throttle = RefreshThrottle(self.update_rate)
+        self._throttle.start(context)
         context.window.cursor_modal_set("SCROLL_Y")
         context.window_manager.modal_handler_add(self)
         
         return {'RUNNING_MODAL'}
     
     def cancel(self, context):
+        if self._throttle: self._throttle.stop(context)
         context.area.header_text_set(None)
         context.window.cursor_modal_restore()
     
@@ -1535,6 +2301,7 @@ Uses active stroke only enabled material.
     bl_options = {'REGISTER', 'UNDO_GROUPED'}
     
     _handle = None
+    _overlays = None
     _cx = _cy = _xoff = _yoff = _size = _align = _radius = 0
     _json_file = _text = ""
     _shadow_offset = -0.025
@@ -1714,11 +2481,11 @@ Uses active stroke only enabled material.
             if region.type == 'WINDOW':
                 break
 
-        shader = gpu.shader.from_builtin('UNIFORM_COLOR')
         gpu.state.blend_set('ALPHA')
 
         lineWidth = int(self.gptext_thickness / 4)
-        gpu.state.line_width_set( lineWidth )
+        view = viewKey(region, space.region_3d)
+        text = (self._radius, self._xoff, self._yoff, self._cx, self._cy, self._size, self._align, self._text, self._json_file)
 
         for rdx in range(1 + 1 * self.gptext_shadow):    
             if self.gptext_shadow and rdx == 0:
@@ -1729,15 +2496,19 @@ Uses active stroke only enabled material.
                 yoffset = 0
 
             clr = (s2lin(clr.r), s2lin(clr.g), s2lin(clr.b), 1)
-            shader.uniform_float("color", clr)
 
-            for stroke in self._strokes:
-                stroke2d = []
-                for point in stroke:
-                    p = view3d_utils.location_3d_to_region_2d(region, space.region_3d, (point[0] + yoffset,0 ,point[1] - yoffset))
-                    stroke2d.append(p)
-                batch = batch_for_shader(shader, 'LINE_STRIP', {"pos": stroke2d})
-                batch.draw(shader)    
+            # all strokes of a pass share one batch, rebuilt when the text or view changes
+            overlay = self._overlays[rdx]
+            if overlay.key != (view, text, yoffset):
+                strips = []
+                for stroke in self._strokes:
+                    stroke2d = []
+                    for point in stroke:
+                        p = view3d_utils.location_3d_to_region_2d(region, space.region_3d, (point[0] + yoffset,0 ,point[1] - yoffset))
+                        stroke2d.append(p)
+                    strips.append(stroke2d)
+                overlay.update( (view, text, yoffset), strips )
+            overlay.draw_lines(clr, lineWidth)
                 
         # restore opengl defaults
         gpu.state.line_width_set(1.0)
@@ -1786,6 +2557,7 @@ Uses active stroke only enabled material.
         x = context.area.x + int(context.area.width / 2)
         y = context.area.y
         context.window.cursor_warp(x,y + 120);
+        self._overlays = [ OverlayBatch(), OverlayBatch() ]
         self._handle = bpy.types.SpaceView3D.draw_handler_add(self.draw_callback_px, (context,), 'WINDOW', 'POST_PIXEL')
         return context.window_manager.invoke_props_dialog(self)
 
@@ -2037,23 +2809,757 @@ class quickTaperStrokeOperator(bpy.types.Operator):
 
 
 
+def edgeBox(edge):
+    (x1, y1), (x2, y2) = edge
+    return ( min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2) )
+
+
+def boxesOverlap(b1, b2):
+    return not (b1[0] > b2[2] or b1[2] < b2[0] or b1[1] > b2[3] or b1[3] < b2[1])
+
+
+SWEEP_BANDS = 256 # most horizontal bands a sweep splits the edges' extent into
+
+def sweepHits(edges, fresh = None, progress = None):
+    """Sweep-line pass over 2d edges, left to right.
+Only edges whose bounding boxes overlap are tested with intersect_line_line_2d.
+With fresh given, only pairs with at least one fresh edge are tested.
+progress is called with the swept fraction of the edges.
+Returns { edge : { other edge : intersection } }
+"""
+    boxes = { edge : edgeBox(edge) for edge in edges }
+    hits = { edge : {} for edge in edges }
+
+    if len(boxes) == 0:
+        return hits
+
+    # active edges are bucketed in horizontal bands about one edge high,
+    # capped so a single tall edge never spans more than SWEEP_BANDS of them
+    heights = sorted(box[3] - box[1] for box in boxes.values())
+    bottom = min(box[1] for box in boxes.values())
+    top = max(box[3] for box in boxes.values())
+    band = max(heights[len(heights) // 2], (top - bottom) / SWEEP_BANDS, 0.0001)
+
+    def bands(box):
+        return range(math.floor((box[1] - bottom) / band), math.floor((box[3] - bottom) / band) + 1)
+
+    active = {}
+    expiry = [] # heap of ( right x, order, edge )
+
+    for order, edge in enumerate(sorted(boxes, key=lambda e: boxes[e][0])):
+        box = boxes[edge]
+        is_fresh = fresh == None or edge in fresh
+
+        if progress and order % 1000 == 0:
+            progress(order / len(boxes))
+
+        # drop edges that end left of the sweep line
+        while expiry and expiry[0][0] < box[0]:
+            old = heapq.heappop(expiry)[2]
+            for b in bands(boxes[old]):
+                active[b].discard(old)
+
+        tested = set()
+        for b in bands(box):
+            for other in active.get(b, ()):
+                if other in tested: continue
+                tested.add(other)
+                if not is_fresh and other not in fresh: continue
+                obox = boxes[other]
+                if obox[1] > box[3] or obox[3] < box[1]: continue
+                # same argument order as testing every edge against all others
+                ix = mathutils.geometry.intersect_line_line_2d(other[0], other[1], edge[0], edge[1])
+                if ix: hits[edge][other] = ix
+                ix = mathutils.geometry.intersect_line_line_2d(edge[0], edge[1], other[0], other[1])
+                if ix: hits[other][edge] = ix
+
+        for b in bands(box):
+            active.setdefault(b, set()).add(edge)
+        heapq.heappush(expiry, (box[2], order, edge))
+
+    return hits
+
+
+def splitEdge(edge, intersections, prec):
+    """Pieces of an edge between its intersections, none if it touches nothing"""
+    v1 = Vector(edge[0])
+    ixs = []
+    for ix in intersections:
+        ix_rounded = (round(ix[0], prec), round(ix[1], prec))
+        ixs.append( ((v1 - Vector(ix_rounded)).length, ix_rounded) )
+    ixs.sort()
+
+    if len(ixs) < 2:
+        return [edge] if ixs else []
+
+    pieces = []
+    pt = edge[0]
+    for _, ix in ixs:
+        if ix != pt and ix != (pt[1], pt[0]):
+            pieces.append( (pt, ix) )
+        pt = ix
+    return pieces
+
+
+def splitEdges(edges, prec):
+    """Split edges at their intersections, dropping edges that touch nothing"""
+    poly_edges = set()
+    for edge, hits in sweepHits(edges).items():
+        poly_edges.update(splitEdge(edge, hits.values(), prec))
+    return poly_edges
+
+
+def pruneEdges(edges, threshold):
+    """Peel dangling chains off an edge set in one pass.
+Vertices are snapped to the threshold grid, duplicate edges are dropped.
+"""
+    def snap(pt):
+        return (round(pt[0] / threshold), round(pt[1] / threshold))
+
+    links = {} # snapped vertex -> edges using it
+    ends = {}
+    for edge in edges:
+        k1 = snap(edge[0])
+        k2 = snap(edge[1])
+        if k1 == k2: continue
+        key = (k1, k2) if k1 < k2 else (k2, k1)
+        if key in ends: continue
+        ends[key] = edge
+        links.setdefault(k1, set()).add(key)
+        links.setdefault(k2, set()).add(key)
+
+    queue = [k for k, keys in links.items() if len(keys) == 1]
+    while queue:
+        k = queue.pop()
+        if len(links[k]) != 1: continue
+        key = links[k].pop()
+        del ends[key]
+        other = key[1] if key[0] == k else key[0]
+        links[other].discard(key)
+        if len(links[other]) == 1:
+            queue.append(other)
+
+    return set(ends.values())
+
+
+def buildFaces(edges):
+    """Walk the half edges of a planar edge set.
+Returns the bounded faces as [ ( area, (minx, miny, maxx, maxy), loop ) ]
+"""
+    adjacency = {}
+    for v1, v2 in edges:
+        if v1 == v2: continue
+        adjacency.setdefault(v1, set()).add(v2)
+        adjacency.setdefault(v2, set()).add(v1)
+
+    # outgoing half edges of every vertex sorted counter clockwise
+    fan = {}
+    slot = {}
+    for v, ends in adjacency.items():
+        fan[v] = sorted(ends, key=lambda e: math.atan2(e[1] - v[1], e[0] - v[0]))
+        for idx, e in enumerate(fan[v]):
+            slot[(v, e)] = idx
+
+    faces = []
+    visited = set()
+
+    for start in slot:
+        if start in visited: continue
+        loop = []
+        half_edge = start
+        while half_edge not in visited:
+            visited.add(half_edge)
+            v1, v2 = half_edge
+            loop.append(v1)
+            # next half edge leaves v2 just clockwise of the way back to v1
+            half_edge = (v2, fan[v2][slot[(v2, v1)] - 1])
+
+        # counter clockwise loops enclose a face, the rest are outer boundaries
+        area = 0
+        for idx in range(len(loop)):
+            p1 = loop[idx - 1]
+            p2 = loop[idx]
+            area += p1[0] * p2[1] - p2[0] * p1[1]
+        if area <= 0: continue
+
+        xs = [p[0] for p in loop]
+        ys = [p[1] for p in loop]
+        faces.append( (area / 2, (min(xs), min(ys), max(xs), max(ys)), loop) )
+
+    return faces
+
+
+def boxTree(entries, size = 8):
+    """Pack [ (box, item) ] into a static R-tree (sort-tile-recursive).
+Nodes are ( box, children, is_leaf ), leaf children are the entries.
+"""
+    nodes = list(entries)
+    if len(nodes) == 0:
+        return None
+
+    leaf = True
+    while True:
+        slices = math.ceil(math.sqrt(math.ceil(len(nodes) / size)))
+        nodes.sort(key=lambda n: n[0][0] + n[0][2])
+        packed = []
+        for sdx in range(0, len(nodes), slices * size):
+            tile = sorted(nodes[sdx:sdx + slices * size], key=lambda n: n[0][1] + n[0][3])
+            for gdx in range(0, len(tile), size):
+                group = tile[gdx:gdx + size]
+                box = ( min(n[0][0] for n in group), min(n[0][1] for n in group),
+                    max(n[0][2] for n in group), max(n[0][3] for n in group) )
+                packed.append( (box, group, leaf) )
+        nodes = packed
+        leaf = False
+        if len(nodes) == 1:
+            return nodes[0]
+
+
+def boxTreeQuery(tree, box):
+    """Items of a boxTree whose boxes overlap box"""
+    found = []
+    stack = [tree] if tree else []
+    while stack:
+        nbox, children, leaf = stack.pop()
+        if not boxesOverlap(nbox, box):
+            continue
+        if not leaf:
+            stack.extend(children)
+            continue
+        found.extend(item for cbox, item in children if boxesOverlap(cbox, box))
+    return found
+
+
+ATTRIBUTE_PROPS = { # data_type : ( foreach property, values per element )
+    'FLOAT' : ('value', 1),
+    'INT' : ('value', 1),
+    'INT8' : ('value', 1),
+    'BOOLEAN' : ('value', 1),
+    'FLOAT2' : ('vector', 2),
+    'FLOAT_VECTOR' : ('vector', 3),
+    'FLOAT_COLOR' : ('color', 4),
+    'BYTE_COLOR' : ('color', 4),
+    'QUATERNION' : ('value', 4),
+}
+
+ATTRIBUTE_DEFAULTS = { # value of elements a drawing does not store an attribute for, 0 if not listed
+    'radius' : 0.01,
+    'opacity' : 1.0,
+    'fill_opacity' : 1.0,
+}
+
+def readAttribute(drawing, name, data_type, domain):
+    """Flat values of a drawing attribute, defaults if the drawing does not store it"""
+    attr = drawing.attributes.get(name)
+    if attr == None:
+        count = len(drawing.attributes['position'].data) if domain == 'POINT' else len(drawing.strokes)
+        return [ATTRIBUTE_DEFAULTS.get(name, 0)] * (count * ATTRIBUTE_PROPS[data_type][1])
+    prop, width = ATTRIBUTE_PROPS[attr.data_type]
+    values = [0] * (len(attr.data) * width)
+    attr.data.foreach_get(prop, values)
+    return values
+
+def writeAttribute(drawing, name, data_type, domain, start, values):
+    """Bulk write flat values into a drawing attribute from element start on, created if missing"""
+    if drawing.attributes.get(name) == None:
+        drawing.attributes.new(name, data_type, domain)
+        data = attributeArray(drawing, name)
+        data[:] = ATTRIBUTE_DEFAULTS.get(name, 0)
+    else:
+        data = attributeArray(drawing, name)
+    width = ATTRIBUTE_PROPS[data_type][1]
+    data.reshape(-1)[start * width:start * width + len(values)] = values
+    setAttributeArray(drawing, name, data)
+
+
+ATTRIBUTE_DTYPES = { # data_type : NumPy type matching the foreach property
+    'FLOAT' : numpy.float32,
+    'INT' : numpy.int32,
+    'INT8' : numpy.int32,
+    'BOOLEAN' : numpy.bool_,
+    'FLOAT2' : numpy.float32,
+    'FLOAT_VECTOR' : numpy.float32,
+    'FLOAT_COLOR' : numpy.float32,
+    'BYTE_COLOR' : numpy.float32,
+    'QUATERNION' : numpy.float32,
+}
+
+def attributeArray(drawing, name):
+    """( elements, values per element ) NumPy array of an existing drawing attribute"""
+    attr = drawing.attributes[name]
+    prop, width = ATTRIBUTE_PROPS[attr.data_type]
+    values = numpy.empty(len(attr.data) * width, dtype=ATTRIBUTE_DTYPES[attr.data_type])
+    attr.data.foreach_get(prop, values)
+    return values.reshape(-1, width)
+
+def setAttributeArray(drawing, name, values):
+    attr = drawing.attributes[name]
+    attr.data.foreach_set(ATTRIBUTE_PROPS[attr.data_type][0], values.ravel())
+
+
+def insertStrokePoints(drawing, sizes, inserts, select_domain = 'POINT'):
+    """Insert points into strokes of a drawing, reading and writing each point attribute once.
+sizes are the current stroke sizes, inserts maps a stroke index to [ ( point index, position ) ]
+sorted along the stroke. A new point follows the point at point index, copies its attributes and is selected.
+With stroke selection (CURVE domain) the points have no selection of their own,
+the new points share their stroke's and it is left unchanged.
+"""
+    selection = drawing.attributes.get('.selection')
+    if selection == None and select_domain == 'POINT':
+        # a drawing without a selection has every point selected
+        drawing.attributes.new('.selection', 'BOOLEAN', 'POINT')
+        setAttributeArray(drawing, '.selection', numpy.ones(len(drawing.attributes['position'].data), dtype=bool))
+    names = [ attr.name for attr in drawing.attributes if attr.domain == 'POINT' and attr.data_type in ATTRIBUTE_DTYPES ]
+    arrays = { name : attributeArray(drawing, name) for name in names }
+
+    # old point each new point takes its attributes from, and the rows that are inserted points
+    source = []
+    added = []
+    positions = []
+    start = 0
+    for sdx, n in enumerate(sizes):
+        at = 0
+        for pdx, pos in inserts.get(sdx, ()):
+            source.extend(range(start + at, start + pdx + 1))
+            added.append(len(source))
+            source.append(start + pdx)
+            positions.append(pos)
+            at = pdx + 1
+        source.extend(range(start + at, start + n))
+        start += n
+
+    indices = sorted(inserts)
+    drawing.resize_strokes([ sizes[sdx] + len(inserts[sdx]) for sdx in indices ], indices=indices)
+    for name, values in arrays.items():
+        values = values[source]
+        if name == 'position':
+            values[added] = positions
+        elif name == '.selection':
+            values[added] = True
+        setAttributeArray(drawing, name, values)
+    drawing.tag_positions_changed()
+
+
+SUBMERGE_MIN_SPACING = 0.005 # finest spacing, the merge distance the old subdivide rounds used
+
+def arcSamples(lengths, spacing):
+    """( segment, weight ) arrays of points spread evenly by arc length over a polyline with segment lengths.
+The first and last samples are exactly the polyline's end points.
+"""
+    cum = numpy.concatenate( ([0.0], numpy.cumsum(lengths)) )
+    count = max(1, int(round(cum[-1] / spacing)))
+    targets = numpy.linspace(0.0, cum[-1], count + 1)
+    seg = numpy.clip(numpy.searchsorted(cum, targets, side='right') - 1, 0, len(lengths) - 1)
+    span = lengths[seg]
+    weight = numpy.clip((targets - cum[seg]) / numpy.where(span > 0, span, 1), 0, 1)
+    seg[0], weight[0] = 0, 0
+    seg[-1], weight[-1] = len(lengths) - 1, 1
+    return seg, weight
+
+
+class StrokeSnapshot:
+    """Stroke sizes, point selection and every point attribute array of a drawing, read in bulk.
+resample evenly respaces the selected runs of points from it without touching the drawing.
+"""
+
+    def __init__(self, drawing):
+        strokes = [ (len(s.points), s.cyclic) for s in drawing.strokes ]
+        self.sizes = numpy.array([ n for n, _ in strokes ], dtype=numpy.int64)
+        self.cyclic = numpy.array([ c for _, c in strokes ], dtype=bool)
+        names = [ attr.name for attr in drawing.attributes if attr.domain == 'POINT' and attr.data_type in ATTRIBUTE_DTYPES ]
+        self.arrays = { name : attributeArray(drawing, name) for name in names }
+        self.current = self.sizes # stroke sizes the drawing has now
+
+        sel = drawing.attributes.get('.selection')
+        if sel == None: # nothing stored, everything is selected
+            self.selected = numpy.ones(int(self.sizes.sum()), dtype=bool)
+        elif sel.domain == 'POINT':
+            self.selected = self.arrays['.selection'][:, 0].copy()
+        else: # stroke selection, every point of a selected stroke counts
+            self.selected = numpy.repeat(attributeArray(drawing, '.selection')[:, 0], self.sizes)
+
+    def resample(self, spacing):
+        """( stroke sizes, point attribute arrays ) with the selected runs of points respaced to spacing"""
+        spacing = max(spacing, SUBMERGE_MIN_SPACING)
+        positions = self.arrays['position'].astype(numpy.float64)
+        first = []
+        second = []
+        weights = []
+        sizes = self.sizes.copy()
+
+        start = 0
+        for sdx, n in enumerate(self.sizes.tolist()):
+            sel = self.selected[start:start + n]
+            if n < 2 or not sel.any():
+                first.append(numpy.arange(start, start + n))
+                second.append(numpy.arange(start, start + n))
+                weights.append(numpy.zeros(n))
+                start += n
+                continue
+
+            if self.cyclic[sdx] and sel.all(): # closed loop, anchored at its first point
+                runs = [ numpy.append(numpy.arange(start, start + n), start) ]
+            else: # runs of selected points, unselected points stay as they are
+                edges = numpy.flatnonzero(numpy.diff(numpy.concatenate(([0], sel.astype(numpy.int8), [0]))))
+                runs = []
+                at = 0
+                for a, b in zip(edges[0::2], edges[1::2]):
+                    runs.append(numpy.arange(start + at, start + a))
+                    runs.append(numpy.arange(start + a, start + b))
+                    at = b
+                runs.append(numpy.arange(start + at, start + n))
+
+            count = 0
+            for run in runs:
+                if len(run) < 2 or not self.selected[run[0]]:
+                    first.append(run)
+                    second.append(run)
+                    weights.append(numpy.zeros(len(run)))
+                    count += len(run)
+                    continue
+                lengths = numpy.linalg.norm(positions[run[1:]] - positions[run[:-1]], axis=1)
+                seg, weight = arcSamples(lengths, spacing)
+                if run[-1] == run[0]: # the loop's closing sample is its first point again
+                    seg, weight = seg[:-1], weight[:-1]
+                    if len(seg) < 3:
+                        seg, weight = numpy.arange(len(run) - 1), numpy.zeros(len(run) - 1)
+                first.append(run[seg])
+                second.append(run[seg + 1])
+                weights.append(weight)
+                count += len(seg)
+            sizes[sdx] = count
+            start += n
+
+        first = numpy.concatenate(first) if first else numpy.zeros(0, dtype=numpy.int64)
+        second = numpy.concatenate(second) if second else numpy.zeros(0, dtype=numpy.int64)
+        weights = numpy.concatenate(weights)[:, None] if weights else numpy.zeros( (0, 1) )
+        arrays = {}
+        for name, values in self.arrays.items():
+            a = values[first]
+            if values.dtype.kind == 'f':
+                arrays[name] = (a * (1 - weights) + values[second] * weights).astype(values.dtype)
+            else: # flags and indices are not blended
+                arrays[name] = numpy.where(weights < 0.5, a, values[second])
+        return sizes, arrays
+
+    def apply(self, drawing, sizes, arrays):
+        """Write resampled strokes into the drawing the snapshot was taken from"""
+        changed = numpy.flatnonzero(sizes != self.current)
+        if len(changed) > 0:
+            drawing.resize_strokes(sizes[changed].tolist(), indices=changed.tolist())
+        for name, values in arrays.items():
+            setAttributeArray(drawing, name, values)
+        self.current = sizes
+        drawing.tag_positions_changed()
+
+    def restore(self, drawing):
+        self.apply(drawing, self.sizes, self.arrays)
+
+
+def strokeBoxes(positions, sizes):
+    """( x min, z min, x max, z max ) row per stroke from a drawing's position array, empty strokes get an empty box"""
+    starts = numpy.cumsum(sizes) - sizes
+    boxes = numpy.empty( (len(sizes), 4) )
+    boxes[:] = (numpy.inf, numpy.inf, -numpy.inf, -numpy.inf)
+    filled = numpy.flatnonzero(sizes > 0)
+    if len(filled) > 0:
+        for col, axis, reduce in ( (0, 0, numpy.minimum), (1, 2, numpy.minimum), (2, 0, numpy.maximum), (3, 2, numpy.maximum) ):
+            boxes[filled, col] = reduce.reduceat(positions[:, axis], starts[filled])
+    return boxes
+
+
+def pointInPoly(x, y, poly):
+    inside = False
+    p1x, p1y = poly[0]
+    n = len(poly)
+    for i in range(n+1):
+        p2x, p2y = poly[i % n]
+        if y > min(p1y, p2y):
+            if y <= max(p1y, p2y):
+                if x <= max(p1x, p2x):
+                    if p1y != p2y:
+                        xinters = (y-p1y) * (p2x-p1x)/(p2y-p1y)+p1x
+                    if p1x == p2x or x <= xinters:
+                        inside = not inside
+        p1x, p1y = p2x, p2y
+    return inside
+
+
+def simplifyPolyline(points, tolerance):
+    """Ramer-Douglas-Peucker on an open polyline, the end points are kept"""
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [ (0, len(points) - 1) ]
+
+    while stack:
+        first, last = stack.pop()
+        (x1, y1), (x2, y2) = points[first], points[last]
+        dx = x2 - x1
+        dy = y2 - y1
+        length = math.hypot(dx, dy)
+
+        worst = tolerance
+        split = None
+        for idx in range(first + 1, last):
+            px, py = points[idx]
+            if length > 0:
+                dist = abs(dy * (px - x1) - dx * (py - y1)) / length
+            else:
+                dist = math.hypot(px - x1, py - y1)
+            if dist > worst:
+                worst = dist
+                split = idx
+
+        if split != None:
+            keep[split] = True
+            stack.append( (first, split) )
+            stack.append( (split, last) )
+
+    return [pt for pt, k in zip(points, keep) if k]
+
+
+def simplifyLoop(loop, tolerance):
+    """Ramer-Douglas-Peucker on a closed loop, split at the point farthest from the first"""
+    if len(loop) < 4:
+        return loop
+    x0, y0 = loop[0]
+    far = max(range(len(loop)), key=lambda idx: (loop[idx][0] - x0) ** 2 + (loop[idx][1] - y0) ** 2)
+    if far == 0:
+        return loop
+    ring = list(loop) + [loop[0]]
+    ret = simplifyPolyline(ring[:far + 1], tolerance) + simplifyPolyline(ring[far:], tolerance)[1:-1]
+    return ret if len(ret) >= 3 else loop
+
+
+def collapseCollinear(loop):
+    """Drop loop points lying on a straight run between their neighbours"""
+    ret = []
+    n = len(loop)
+    for idx in range(n):
+        (x0, y0), (x1, y1), (x2, y2) = loop[idx - 1], loop[idx], loop[(idx + 1) % n]
+        ax, ay = x1 - x0, y1 - y0
+        bx, by = x2 - x1, y2 - y1
+        if abs(ax * by - ay * bx) <= 1e-6 * math.hypot(ax, ay) * math.hypot(bx, by) and ax * bx + ay * by > 0:
+            continue
+        ret.append(loop[idx])
+    return ret if len(ret) >= 3 else loop
+
+
+def strokeEdges(pts, cyclic):
+    edges = set(zip(pts, pts[1:]))
+    if cyclic and pts[-1] != pts[0]:
+        edges.add((pts[-1], pts[0]))
+    return edges
+
+
+def fillFaceAt(edges, spot, prec, threshold):
+    """Planarize raw edges and return the loop of the smallest face enclosing spot.
+Runs on a pool thread, so only plain coordinates go in and out.
+"""
+    poly_edges = pruneEdges(splitEdges(edges, prec), threshold)
+    found = None
+    for area, box, loop in buildFaces(poly_edges):
+        if found and found[0] <= area: continue
+        if not (box[0] <= spot[0] <= box[2] and box[1] <= spot[1] <= box[3]): continue
+        if pointInPoly(spot[0], spot[1], loop):
+            found = (area, loop)
+    return found[1] if found else None
+
+
+def framePool():
+    """Thread pool for per-frame planarization.
+Forking the running Blender process can deadlock on locks held by its other threads,
+so frames are planarized one after the other on a single thread next to the UI.
+"""
+    return concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+
+def strokeCoords(drawing, prec):
+    """( (x, z) points rounded to prec, cyclic ) of every stroke of a drawing.
+Positions are read in one bulk call.
+"""
+    strokes = [ (len(s.points), s.cyclic) for s in drawing.strokes ]
+    positions = [0.0] * (sum(n for n, _ in strokes) * 3)
+    if len(positions) > 0:
+        drawing.attributes['position'].data.foreach_get('vector', positions)
+
+    ret = []
+    idx = 0
+    for n, cyclic in strokes:
+        ret.append( (tuple((round(positions[pdx], prec), round(positions[pdx + 2], prec)) 
+            for pdx in range(idx, idx + n * 3, 3)), cyclic) )
+        idx += n * 3
+    return ret
+
+
+def gapBridges(ends, tolerance):
+    """Edges joining each open stroke end to its nearest other end within tolerance"""
+    tree = mathutils.kdtree.KDTree(len(ends))
+    for idx, pt in enumerate(ends):
+        tree.insert((pt[0], pt[1], 0), idx)
+    tree.balance()
+
+    bridges = set()
+    for idx, pt in enumerate(ends):
+        near = [ (dist, jdx) for co, jdx, dist in tree.find_range((pt[0], pt[1], 0), tolerance) if jdx != idx ]
+        if len(near) == 0: continue
+        other = ends[min(near)[1]]
+        if other == pt: continue # already joined
+        bridges.add( (pt, other) if pt < other else (other, pt) )
+    return bridges
+
+
+class PlanarGraph:
+    """Planarized edges of a drawing, updated stroke by stroke"""
+
+    def __init__(self, prec, threshold):
+        self.prec = prec
+        self.threshold = threshold
+        self.strokes = {} # ( layer, frame, points, cyclic ) -> raw edges
+        self.refs = {}    # raw edge -> number of strokes using it
+        self.hits = {}    # raw edge -> { other raw edge : intersection }
+        self.links = {}   # raw edge -> raw edges it touches, both ways
+        self.pieces = {}  # raw edge -> split edges
+        self.edges = []
+        self.faces = []
+        self.face_tree = None
+        self.progress = 1.0
+        self.error = None # exception of a failed update, the graph is then half spliced and unusable
+        self.lock = threading.Lock()
+
+    def update(self, strokes):
+        """Splice in added strokes and take out removed ones, safe to run on a worker thread.
+strokes = { ( layer, frame, points, cyclic ) : raw edges }
+"""
+        with self.lock:
+            self.progress = 0.0
+            try:
+                changed = self.splice(strokes)
+            except Exception as e:
+                self.error = e
+                changed = False
+            self.progress = 1.0
+        return changed
+
+    def splice(self, strokes):
+        gone = [key for key in self.strokes if key not in strokes]
+        new = [key for key in strokes if key not in self.strokes]
+        if len(gone) == 0 and len(new) == 0:
+            return False
+
+        removed = set()
+        added = set()
+        for key in gone:
+            for edge in self.strokes.pop(key):
+                self.refs[edge] -= 1
+                if self.refs[edge] == 0:
+                    del self.refs[edge]
+                    removed.add(edge)
+        for key in new:
+            self.strokes[key] = strokes[key]
+            for edge in strokes[key]:
+                if edge in self.refs:
+                    self.refs[edge] += 1
+                else:
+                    self.refs[edge] = 1
+                    added.add(edge)
+
+        # edges moved from one stroke to another keep their intersections
+        kept = removed & added
+        removed -= kept
+        added -= kept
+
+        dirty = set()
+        for edge in removed:
+            for other in self.links.pop(edge):
+                if other in self.links:
+                    self.links[other].discard(edge)
+                    self.hits[other].pop(edge, None)
+                    dirty.add(other)
+            del self.hits[edge]
+            del self.pieces[edge]
+        dirty -= removed
+
+        if len(added) > 0:
+            # only edges near the new ones take part in the sweep
+            boxes = [edgeBox(edge) for edge in added]
+            area = ( min(b[0] for b in boxes), min(b[1] for b in boxes), max(b[2] for b in boxes), max(b[3] for b in boxes) )
+            near = [edge for edge in self.refs if edge not in added and boxesOverlap(edgeBox(edge), area)]
+            for edge in added:
+                self.hits[edge] = {}
+                self.links[edge] = set()
+            def swept(fraction):
+                self.progress = fraction * 0.6
+            for edge, hits in sweepHits(near + list(added), added, swept).items():
+                if hits:
+                    self.hits[edge].update(hits)
+                    for other in hits:
+                        self.links[edge].add(other)
+                        self.links[other].add(edge)
+                    dirty.add(edge)
+            dirty |= added
+
+        self.progress = 0.6
+        for edge in dirty:
+            self.pieces[edge] = splitEdge(edge, self.hits[edge].values(), self.prec)
+
+        self.progress = 0.7
+        poly_edges = set()
+        for pieces in self.pieces.values():
+            poly_edges.update(pieces)
+        self.edges = list(pruneEdges(poly_edges, self.threshold))
+
+        self.progress = 0.8
+        self.faces = buildFaces(self.edges)
+        self.face_tree = boxTree([ (face[1], idx) for idx, face in enumerate(self.faces) ])
+        return True
+
+
+_planar_graphs = {} # grease pencil data session_uid -> PlanarGraph
+
+@bpy.app.handlers.persistent
+def clearPlanarGraphs(dummy):
+    _planar_graphs.clear()
+
+
 class quickGeometryFillOperator(bpy.types.Operator):
     """Click to fill with matching points\nusing acive material and color"""
     bl_idname = "quicktools.geometry_fill"
     bl_label = "QuickTools Geometry Fill"
 
     _poly_edges = []
+    _faces = [] # ( area, bounding box, loop )
+    _face_tree = None
+    _previews = {}
+    _hover = None
+    _handle = None
+    _timer = None
+    _worker = None
+    _graph = None
+    _graph_key = None
+    _queued = [] # clicks made while the graph is built
+    _rebuild = False
+    _pool = None
+    _futures = {} # pending frame -> frame_number
+    _frame_count = _filled = _failed = 0
     
     PREC = 4
     THRESHOLD = 0.00001
 
-    def createStroke(self, points):
+    fill_all : bpy.props.BoolProperty(name="Fill All", description="Fill every enclosed region of the current frame at once", default=False)
+    min_area : bpy.props.FloatProperty(name="Minimum Area", description="Enclosed regions smaller than this are not filled by Fill All", default=0.0, min=0.0)
+    gap_tolerance : bpy.props.FloatProperty(name="Close Gaps", description="Join open stroke ends closer than this before filling", default=0.0, min=0.0)
+    fill_frames : bpy.props.BoolProperty(name="Fill Frames", description="Fill the clicked region on every keyframe of the active layer", default=False)
+    simplify_pixels : bpy.props.FloatProperty(name="Simplify", description="Drop fill points closer than this many pixels to the outline", default=0.0, min=0.0)
+    collapse_collinear : bpy.props.BoolProperty(name="Collapse Straight Runs", description="Drop fill points lying on a straight line between their neighbours", default=False)
+
+    def createStrokes(self, loops, frame_number = None, push_undo = True):
+        """Add a cyclic fill stroke per loop with one add_strokes call and bulk attribute writes"""
         C = bpy.context
 
         matIndex = C.active_object.active_material_index
         lineWidth = C.tool_settings.gpencil_paint.brush.size
 
-        clr = C.tool_settings.gpencil_paint.brush.color
         vertexColor = (0,0,0,1)
         
         clr = C.tool_settings.gpencil_paint.brush.color 
@@ -2061,131 +3567,233 @@ class quickGeometryFillOperator(bpy.types.Operator):
         
         gp = C.active_object
         layer = gp.data.layers.active
+
+        if frame_number == None:
+            frame_number = C.scene.frame_current
         
         for frame in layer.frames:
-            if frame.frame_number == C.scene.frame_current:
-                frame.drawing.add_strokes([len(points)])
-                newStroke = frame.drawing.strokes[-1]
-                if newStroke == None:
-                    print("Error adding stroke", len(points))
+            if frame.frame_number == frame_number:
+                drawing = frame.drawing
+                first_stroke = len(drawing.strokes)
+
+                drawing.add_strokes([len(points) for points in loops])
+                if len(drawing.strokes) != first_stroke + len(loops):
+                    print("Error adding strokes", len(loops))
                     return
-                newStroke.material_index = matIndex
-                newStroke.fill_color = fillColor                        
-                for idx, pt in enumerate(points):
-                    newStroke.points[idx].position = (pt[0], 0, pt[1])
-                    newStroke.points[idx].vertex_color = vertexColor
-                    newStroke.points[idx].radius = lineWidth
-                newStroke.cyclic = True
 
-        bpy.ops.ed.undo_push(message = 'Added GeometryFill')
+                positions = [c for points in loops for pt in points for c in (pt[0], 0, pt[1])]
+                count = len(positions) // 3
+                first_point = len(drawing.attributes['position'].data) - count
+                writeAttribute(drawing, 'position', 'FLOAT_VECTOR', 'POINT', first_point, positions)
+                writeAttribute(drawing, 'vertex_color', 'FLOAT_COLOR', 'POINT', first_point, vertexColor * count)
+                writeAttribute(drawing, 'radius', 'FLOAT', 'POINT', first_point, [lineWidth] * count)
+                writeAttribute(drawing, 'material_index', 'INT', 'CURVE', first_stroke, [matIndex] * len(loops))
+                writeAttribute(drawing, 'fill_color', 'FLOAT_COLOR', 'CURVE', first_stroke, fillColor * len(loops))
+                writeAttribute(drawing, 'cyclic', 'BOOLEAN', 'CURVE', first_stroke, [True] * len(loops))
+                drawing.tag_positions_changed()
+
+        gp.data.update_tag()
+        if push_undo:
+            bpy.ops.ed.undo_push(message = 'Added GeometryFill')
 
     def isvclose(v1, v2):
         return (v2 - v1).length < 0.0001
 
-    def pointInPoly(self, x, y, poly):
-        inside = False
-        p1x, p1y = poly[0]
-        n = len(poly)
-        for i in range(n+1):
-            p2x, p2y = poly[i % n]
-            if y > min(p1y, p2y):
-                if y <= max(p1y, p2y):
-                    if x <= max(p1x, p2x):
-                        if p1y != p2y:
-                            xinters = (y-p1y) * (p2x-p1x)/(p2y-p1y)+p1x
-                        if p1x == p2x or x <= xinters:
-                            inside = not inside
-            p1x, p1y = p2x, p2y
-        return inside
-
-    def getIntersections(self, edges, edge):
-        """Get sorted intersections of an edge with other edges"""
-        intersections = []
-        v1, v2 = edge
-        
-        for e in edges:
-            if e == edge:
+    def findFace(self, spot):
+        """Index of the smallest cached face enclosing spot"""
+        candidates = boxTreeQuery(self._face_tree, (spot[0], spot[1], spot[0], spot[1]))
+        candidates.sort(key=lambda idx: self._faces[idx][0])
+        for idx in candidates:
+            if pointInPoly(spot[0], spot[1], self._faces[idx][2]):
+                return idx
+        return None
+
+    def fillPoly(self, context, clicked_spot):
+        idx = self.findFace(clicked_spot)
+        if idx == None:
+            print("no enclosing edges")
+            return
+        self.createStrokes([self.outline(context, self._faces[idx][2])])
+
+    def outline(self, context, loop):
+        """Fill loop with the optional simplification applied"""
+        if self.collapse_collinear:
+            loop = collapseCollinear(loop)
+        if self.simplify_pixels > 0:
+            loop = simplifyLoop(loop, self.pixelLength(context, self.simplify_pixels))
+        return loop
+
+    def pixelLength(self, context, pixels):
+        """World length of a run of pixels at the current zoom"""
+        return (Vector(to3d(context, (pixels, 0))) - Vector(to3d(context, (0, 0)))).length
+
+    def statusText(self, context):
+        frames = "All keyframes" if self.fill_frames else "Current frame"
+        context.workspace.status_text_set(f"Geometry Fill: Click to fill: A = fill all and finish: "
+            f"CTRL+Wheel = min area for fill all ({self.min_area:.4f}): SHIFT+Wheel = close gaps ({self.gap_tolerance:.4f}): "
+            f"F = toggle fill frames ({frames}): ALT+Wheel = simplify ({self.simplify_pixels:g}px), "
+            f"C = toggle collapse straight runs ({'On' if self.collapse_collinear else 'Off'}): Right click to finish.")
+
+    def mouseSpot(self, context, event):
+        pt = view3d_utils.region_2d_to_location_3d(context.region, context.space_data.region_3d, 
+            (event.mouse_region_x, event.mouse_region_y), (0,0,0))
+        return (pt[0], pt[2])
+
+    def setHover(self, context, idx):
+        if idx != self._hover:
+            self._hover = idx
+            context.area.tag_redraw()
+
+    def draw_callback_view(self, context):
+        if self._hover == None: return
+
+        shader = overlayShader()
+
+        # one batch per face, built the first time the face is hovered
+        batch = self._previews.get(self._hover)
+        if batch == None:
+            loop = [ Vector((p[0], 0, p[1])) for p in self._faces[self._hover][2] ]
+            tris = mathutils.geometry.tessellate_polygon([loop])
+            batch = batch_for_shader(shader, 'TRIS', {"pos": loop}, indices=tris)
+            self._previews[self._hover] = batch
+
+        clr = context.tool_settings.gpencil_paint.brush.color
+        gpu.state.blend_set('ALPHA')
+        shader.uniform_float("color", (s2lin(clr.r), s2lin(clr.g), s2lin(clr.b), 0.5))
+        batch.draw(shader)
+        gpu.state.blend_set('NONE')
+
+    def frameStrokes(self, gp, frame_number, cached):
+        """{ ( layer, frame, points, cyclic ) : raw edges } of the visible layers at frame_number.
+Strokes found in cached reuse their edges.
+"""
+        strokes = {}
+        ends = []
+        for layer in gp.data.layers:
+            if layer.hide or layer.lock:
                 continue
-            ix = mathutils.geometry.intersect_line_line_2d(e[0], e[1], v1, v2)
-            if ix:
-                ix_rounded = (round(ix[0], self.PREC), round(ix[1], self.PREC))
-                dist = (Vector(v1) - Vector(ix_rounded)).length
-                intersections.append((dist, ix_rounded))
-        
-        return sorted(intersections)
+            frame = layer.get_frame_at(frame_number)
+            if frame == None:
+                continue
+            for pts, cyclic in strokeCoords(frame.drawing, self.PREC):
+                if len(pts) < 2:
+                    continue
+                if not cyclic:
+                    ends.append(pts[0])
+                    ends.append(pts[-1])
+                key = (layer.name, frame.frame_number, pts, cyclic)
+                strokes[key] = cached[key] if key in cached else strokeEdges(pts, cyclic)
 
-    def getConnectedEdges(self, edges, pt):
-        ret = []
-        for edge in edges:
-            if edge[0] == pt or (edge[1] == pt):
-                ret.append(edge)
-        return ret
+        # gaps are closed with extra edges as if they had been drawn
+        if self.gap_tolerance > 0 and len(ends) > 0:
+            bridges = gapBridges(ends, self.gap_tolerance)
+            strokes[(None, None, tuple(sorted(bridges)), False)] = bridges
 
-    def fillPoly(self, context, clicked_spot):
-                
-        up_ray = ( (clicked_spot[0], clicked_spot[1]), (clicked_spot[0], 9999) )
+        return strokes
 
-        closest_edges = []
+    def fillFrames(self, context, spot):
+        """Fill the face enclosing spot on every keyframe of the active layer"""
+        gp = context.active_object
+        self._pool = framePool()
+        self._futures = {}
+        for frame in gp.data.layers.active.frames:
+            edges = set()
+            for frame_edges in self.frameStrokes(gp, frame.frame_number, {}).values():
+                edges.update(frame_edges)
+            future = self._pool.submit(fillFaceAt, edges, spot, self.PREC, self.THRESHOLD)
+            self._futures[future] = frame.frame_number
+        self._frame_count = len(self._futures)
+        self._filled = 0
+        self._failed = 0
+
+        self._timer = context.window_manager.event_timer_add(0.05, window=context.window)
+        context.area.header_text_set("Geometry Fill: frame 0 of %d" % self._frame_count)
+
+    def collectFrames(self, context):
+        """Write back finished frames, True once all frames are done"""
+        for future in [f for f in self._futures if f.done()]:
+            frame_number = self._futures.pop(future)
+            try:
+                loop = future.result()
+            except Exception as e: # a failed frame is counted and the rest carry on
+                print("Geometry Fill: frame %d failed: %s" % (frame_number, e))
+                self._failed += 1
+                continue
+            if loop:
+                self.createStrokes([self.outline(context, loop)], frame_number, push_undo=False)
+                self._filled += 1
 
-        for edge in self._poly_edges:
-            ix = mathutils.geometry.intersect_line_line_2d(edge[0], edge[1], up_ray[0], up_ray[1])
-            if ix:
-                closest_edges.append( [ (ix - Vector(clicked_spot)).length, edge ] ) 
+        done = self._frame_count - len(self._futures)
+        context.area.header_text_set("Geometry Fill: frame %d of %d" % (done, self._frame_count))
+        if len(self._futures) > 0:
+            return False
 
-        closest_edges.sort()
+        self._pool.shutdown(wait=False)
+        self._pool = None
+        bpy.ops.ed.undo_push(message = 'Added GeometryFill')
+        if self._failed > 0:
+            self.report({'WARNING'}, "Filled %d of %d frames, %d failed" % (self._filled, self._frame_count, self._failed))
+        else:
+            self.report({'INFO'}, "Filled %d of %d frames" % (self._filled, self._frame_count))
+        return True
 
-        for closest_edge in closest_edges:
-            ev = Vector(closest_edge[1][1]) - Vector(closest_edge[1][0])
-            cv = Vector(closest_edge[1][1]) - Vector(clicked_spot) 
-            
-            clockwise = ev.cross(cv) >= 0
-            
-            closed_poly = [ closest_edge[1][0] ]
-            
-            active_edge = closest_edge[1]
+    def fillSpot(self, context, spot):
+        if not self.fill_frames:
+            self.fillPoly(context, spot)
+        elif self._pool == None:
+            self.fillFrames(context, spot)
+
+    def fillAll(self, context):
+        loops = [self.outline(context, face[2]) for face in self._faces if face[0] >= self.min_area]
+        if len(loops) > 0:
+            self.createStrokes(loops)
+        self.report({'INFO'}, "Filled %d regions" % len(loops))
+
+    def ready(self, context):
+        """Take over the graph built by the worker and fill queued clicks, False if the worker failed"""
+        context.window_manager.event_timer_remove(self._timer)
+        self._timer = None
+        context.area.header_text_set(None)
 
-            while(1):
-                connected_edges = self.getConnectedEdges(self._poly_edges, active_edge[1])
-                
-                if len(connected_edges) == 0:
-                    break
-                
-                sorted = []
-                
-                for edge in connected_edges:
-                    if edge == active_edge or (edge[1], edge[0]) == active_edge:
-                        continue
-                    if edge[1] == active_edge[1]: edge = ( edge[1], edge[0] )
-                    v1 = Vector(active_edge[1]) - Vector(active_edge[0])
-                    v2 = Vector(active_edge[1]) - Vector(edge[1])
-                    cross = v1.cross(v2)
-                    angle = math.degrees(v1.angle(v2))
-                    if clockwise:
-                        if cross < 0: angle = 360 - angle
-                    else:
-                        if cross >= 0: angle = 360 - angle
-                    sorted.append( [ angle, edge ] )
-                
-                if len(sorted) == 0:
-                    print("hanging edge")
-                    return
-                
-                sorted.sort()
-                
-                active_edge = sorted[0][1]
-                
-                closed_poly.append(active_edge[0])
+        if self._graph.error != None:
+            # a half spliced graph is not cached, the next invoke builds it from scratch
+            if _planar_graphs.get(self._graph_key) is self._graph:
+                del _planar_graphs[self._graph_key]
+            self.report({'ERROR'}, "Geometry Fill failed: %s" % self._graph.error)
+            self._queued = []
+            return False
 
-                if active_edge[1] == closed_poly[0]:
-                    break
-                
-                if len(closed_poly) == 9999:
-                    print("quickGeometryFill break limit reached")
-                    break
+        self._poly_edges = self._graph.edges
+        self._faces = self._graph.faces
+        self._face_tree = self._graph.face_tree
+        if self._rebuild: # queued clicks wait for the rebuilt graph
+            return True
 
-            if self.pointInPoly(clicked_spot[0], clicked_spot[1], closed_poly):
-                self.createStroke(closed_poly)
-                break
+        for spot in self._queued:
+            self.fillSpot(context, spot)
+        self._queued = []
+        return True
+
+    def finish(self, context):
+        if self._pool:
+            # frames already written stay, the rest are dropped
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+            self._futures = {}
+            if self._filled > 0:
+                bpy.ops.ed.undo_push(message = 'Added GeometryFill')
+        if self._timer:
+            context.window_manager.event_timer_remove(self._timer)
+            self._timer = None
+            context.area.header_text_set(None)
+        if self._handle:
+            bpy.types.SpaceView3D.draw_handler_remove(self._handle, 'WINDOW')
+            self._handle = None
+        self._previews = {}
+        self._hover = None
+        context.workspace.status_text_set("")
+        context.window.cursor_modal_restore()
+        context.area.tag_redraw()
                 
 
     @classmethod
@@ -2194,14 +3802,44 @@ class quickGeometryFillOperator(bpy.types.Operator):
 
     def modal(self, context, event):
         if event.type in {'RIGHTMOUSE', 'ESC'}:
-            context.window.cursor_modal_restore()
+            self.finish(context)
             return {'FINISHED'}
+
+        if event.type == 'TIMER' and self._timer and self._pool:
+            try:
+                done = self.collectFrames(context)
+            except Exception:
+                # timer, header, draw handler and cursor are cleaned up whatever went wrong
+                self.finish(context)
+                raise
+            if done:
+                self.finish(context)
+                return {'FINISHED'}
+            return {'RUNNING_MODAL'}
+
+        if event.type == 'TIMER' and self._timer:
+            if self._worker.is_alive():
+                context.area.header_text_set("Geometry Fill: building %d%%" % (self._graph.progress * 100))
+                return {'RUNNING_MODAL'}
+            if not self.ready(context):
+                self.finish(context)
+                return {'CANCELLED'}
+            if self._rebuild: # the gap tolerance changed during the build
+                self.startBuild(context)
+                return {'RUNNING_MODAL'}
+            if self.fill_all:
+                self.fillAll(context)
+                self.finish(context)
+                return {'FINISHED'}
+            return {'RUNNING_MODAL'}
             
         if (context.area.x < event.mouse_x < context.area.x + context.area.width) == False:
+            self.setHover(context, None)
             context.window.cursor_modal_restore()
             return {'RUNNING_MODAL'}
         
         if (context.area.y < event.mouse_y < context.area.y + context.area.height) == False:
+            self.setHover(context, None)
             context.window.cursor_modal_restore()
             return {'RUNNING_MODAL'}
         
@@ -2215,6 +3853,7 @@ class quickGeometryFillOperator(bpy.types.Operator):
         wdth = context.area.x + context.area.width - ui_width
         
         if event.mouse_x > wdth:
+            self.setHover(context, None)
             if event.mouse_y > context.area.y + ui_height - 80:
                 context.window.cursor_modal_restore()
                 return {'PASS_THROUGH'}
@@ -2222,68 +3861,102 @@ class quickGeometryFillOperator(bpy.types.Operator):
                 return {'RUNNING_MODAL'}
         
         context.window.cursor_modal_set("PAINT_BRUSH")
+
+        if event.type == 'MOUSEMOVE' and not self._timer:
+            self.setHover(context, self.findFace(self.mouseSpot(context, event)))
+
+        if event.type in {'WHEELUPMOUSE', 'WHEELDOWNMOUSE'} and event.ctrl:
+            step = self.pixelLength(context, 10) ** 2
+            self.min_area = max(self.min_area + (step if event.type == 'WHEELUPMOUSE' else -step), 0)
+            self.statusText(context)
+            return {'RUNNING_MODAL'}
+
+        if event.type in {'WHEELUPMOUSE', 'WHEELDOWNMOUSE'} and event.shift and not self._pool:
+            step = self.pixelLength(context, 2)
+            self.gap_tolerance = max(self.gap_tolerance + (step if event.type == 'WHEELUPMOUSE' else -step), 0)
+            self.statusText(context)
+            # the bridges are edges of the graph, it is rebuilt once a running build is done
+            if self._timer:
+                self._rebuild = True
+            else:
+                self.startBuild(context)
+            return {'RUNNING_MODAL'}
+
+        if event.type in {'WHEELUPMOUSE', 'WHEELDOWNMOUSE'} and event.alt:
+            self.simplify_pixels = max(self.simplify_pixels + (1 if event.type == 'WHEELUPMOUSE' else -1), 0)
+            self.statusText(context)
+            return {'RUNNING_MODAL'}
+
+        if event.type == 'C' and event.value == 'PRESS':
+            self.collapse_collinear = not self.collapse_collinear
+            self.statusText(context)
+            return {'RUNNING_MODAL'}
+
+        if event.type == 'F' and event.value == 'PRESS':
+            self.fill_frames = not self.fill_frames
+            self.statusText(context)
+            return {'RUNNING_MODAL'}
+
+        if event.type == 'A' and event.value == 'PRESS' and not self._pool:
+            if self._timer: # filled once the graph is built
+                self.fill_all = True
+                return {'RUNNING_MODAL'}
+            self.fillAll(context)
+            self.finish(context)
+            return {'FINISHED'}
                 
         if event.type  == 'LEFTMOUSE' and event.value == "PRESS":
-            pt = view3d_utils.region_2d_to_location_3d(context.region, context.space_data.region_3d, 
-                (event.mouse_region_x, event.mouse_region_y), (0,0,0))
-            self.fillPoly(bpy.context, (pt[0], pt[2]) )
+            if self._timer:
+                if not self.fill_all:
+                    self._queued.append(self.mouseSpot(context, event))
+            else:
+                self.fillSpot(bpy.context, self.mouseSpot(context, event) )
             return {'RUNNING_MODAL'}
         
         return {'RUNNING_MODAL'}
 
-    def invoke(self, context, event):
-        """Initialize operator"""
+    def startBuild(self, context):
+        """Build the graph of the current frame on a worker thread, the modal polls for the result"""
         gp = context.active_object
-        self._poly_edges.clear()
         
-        # Use sets for O(1) lookup
-        raw_edges = set()
-        for layer in gp.data.layers:
-            if layer.hide or layer.lock:
-                continue
-            for stroke in layer.current_frame().drawing.strokes:
-                if len(stroke.points) < 2:
-                    continue
-                pts = [(round(v.position[0], self.PREC), round(v.position[2], self.PREC)) 
-                       for v in stroke.points]
-                raw_edges.update((p1, p2) for p1, p2 in zip(pts, pts[1:]))
-                if stroke.cyclic and pts[-1] != pts[0]:
-                    raw_edges.add((pts[-1], pts[0]))
+        # strokes unchanged since the last invoke reuse their cached edges,
+        # the lock waits for a worker of an earlier invoke that may still be splicing them
+        graph = _planar_graphs.get(gp.data.session_uid)
+        if graph != None:
+            with graph.lock:
+                if graph.error == None:
+                    strokes = self.frameStrokes(gp, context.scene.frame_current, graph.strokes)
+                else:
+                    graph = None
+        if graph == None:
+            graph = _planar_graphs[gp.data.session_uid] = PlanarGraph(self.PREC, self.THRESHOLD)
+            strokes = self.frameStrokes(gp, context.scene.frame_current, {})
+
+        # intersections, splitting and hanging edges are only redone around changed strokes,
+        # on a worker thread while the modal polls for the result
+        self._graph = graph
+        self._graph_key = gp.data.session_uid
+        self._worker = threading.Thread(target=graph.update, args=(strokes,), daemon=True)
+        self._worker.start()
+        self._rebuild = False
+
+        self._poly_edges = []
+        self._faces = []
+        self._face_tree = None
+        self._previews = {}
+        self.setHover(context, None)
+
+        self._timer = context.window_manager.event_timer_add(0.05, window=context.window)
+        context.area.header_text_set("Geometry Fill: building 0%")
 
-        # Process intersections
-        poly_edges = set()
-        for edge in raw_edges:
-            intersections = self.getIntersections(raw_edges, edge)
-            if not intersections:
-                continue
-            if len(intersections) == 1:
-                poly_edges.add(edge)
-            else:
-                pt = edge[0]
-                for _, ix in intersections:
-                    if ix != pt and ix != (pt[1], pt[0]):
-                        new_edge = (pt, ix)
-                        poly_edges.add(new_edge)
-                    pt = ix
-
-        # Remove hanging edges efficiently
-        while True:
-            edge_counts = {}
-            for edge in poly_edges:
-                edge_counts[edge] = sum(1 for e in poly_edges if e != edge and 
-                                      ((Vector(e[0]) - Vector(edge[0])).length < self.THRESHOLD or 
-                                       (Vector(e[1]) - Vector(edge[0])).length < self.THRESHOLD or
-                                       (Vector(e[0]) - Vector(edge[1])).length < self.THRESHOLD or
-                                       (Vector(e[1]) - Vector(edge[1])).length < self.THRESHOLD))
-            
-            
-            valid_edges = {e for e, count in edge_counts.items() if count > 1}
-            if len(valid_edges) == len(poly_edges):
-                break
-            poly_edges = valid_edges
+    def invoke(self, context, event):
+        """Initialize operator"""
+        self._queued = []
+        self.startBuild(context)
 
-        self._poly_edges = list(poly_edges)
-        
+        if not self.fill_all:
+            self._handle = bpy.types.SpaceView3D.draw_handler_add(self.draw_callback_view, (context,), 'WINDOW', 'POST_VIEW')
+        self.statusText(context)
         context.window.cursor_modal_set("PAINT_BRUSH")
         context.window_manager.modal_handler_add(self)
         return {'RUNNING_MODAL'}
@@ -2748,6 +4421,7 @@ def register():
             bpy.utils.register_class(cls)
         except:
             pass
+    bpy.app.handlers.load_post.append(clearPlanarGraphs)
         
 def unregister():
     for cls in _classes:
@@ -2755,6 +4429,10 @@ def unregister():
             bpy.utils.unregister_class(cls)
         except:
             pass
+    if clearPlanarGraphs in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(clearPlanarGraphs)
+    _planar_graphs.clear()
+    _overlay_shaders.clear()
 
 if __name__ == "__main__":
     register()
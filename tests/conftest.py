@@ -0,0 +1,22 @@
+"""Load the add-on for tests of its geometry and stroke helpers.
+
+The add-on imports bpy, gpu and mathutils at the top, so run the tests with Blender's Python
+(pytest installed into it):
+
+    blender -b --factory-startup --python-expr "import sys, pytest; sys.exit(pytest.main(['tests']))"
+"""
+
+import importlib.util
+import pathlib
+
+import pytest
+
+
+@pytest.fixture(scope="session")
+def quicktools():
+    pytest.importorskip("bpy")
+    path = pathlib.Path(__file__).resolve().parent.parent / "__init__.py"
+    spec = importlib.util.spec_from_file_location("quicktools", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
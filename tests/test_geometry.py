@@ -0,0 +1,296 @@
+"""Geometry Fill and knife helpers checked against brute force results"""
+
+import math
+import random
+
+import pytest
+
+bpy = pytest.importorskip("bpy") # Blender's Python or the bpy module, see conftest.py
+mathutils = pytest.importorskip("mathutils")
+numpy = pytest.importorskip("numpy")
+
+
+def randomEdges(rng, count, lengths=(0.3, 3.0, 10.0)):
+    edges = set()
+    while len(edges) < count:
+        x, y = rng.uniform(0, 10), rng.uniform(0, 10)
+        span = rng.choice(lengths)
+        edge = ( (round(x, 3), round(y, 3)), (round(x + rng.uniform(-span, span), 3), round(y + rng.uniform(-span, span), 3)) )
+        if edge[0] != edge[1]:
+            edges.add(edge)
+    return edges
+
+
+def bruteHits(edges, fresh=None):
+    hits = { edge : {} for edge in edges }
+    for edge in edges:
+        for other in edges:
+            if other == edge: continue
+            if fresh != None and edge not in fresh and other not in fresh: continue
+            ix = mathutils.geometry.intersect_line_line_2d(other[0], other[1], edge[0], edge[1])
+            if ix: hits[edge][other] = ix
+    return hits
+
+
+def hatchingEdges():
+    """Short flat edges and one tall edge crossing all of them"""
+    rng = random.Random(3)
+    edges = set()
+    for _ in range(400):
+        x, y = round(rng.uniform(0, 100), 3), round(rng.uniform(0, 100), 3)
+        edges.add( ((x, y), (round(x + 1.5, 3), y)) )
+    edges.add( ((50.0, 0.0), (50.5, 100.0)) )
+    return edges
+
+
+def assertSameHits(hits, expected):
+    assert hits.keys() == expected.keys()
+    for edge in expected:
+        assert hits[edge].keys() == expected[edge].keys()
+        for other, ix in expected[edge].items():
+            assert tuple(hits[edge][other]) == pytest.approx(tuple(ix))
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_sweep_hits_match_all_pairs(quicktools, seed):
+    edges = randomEdges(random.Random(seed), 250)
+    assertSameHits(quicktools.sweepHits(edges), bruteHits(edges))
+
+
+def test_sweep_hits_fresh_pairs(quicktools):
+    rng = random.Random(7)
+    edges = randomEdges(rng, 250)
+    fresh = set(rng.sample(sorted(edges), 40))
+    hits = quicktools.sweepHits(edges, fresh)
+    expected = bruteHits(edges, fresh)
+    assertSameHits(hits, expected)
+
+
+def test_sweep_hits_tall_edge_across_flat_hatching(quicktools):
+    edges = hatchingEdges()
+    assertSameHits(quicktools.sweepHits(edges), bruteHits(edges))
+
+
+def test_split_edges_match_all_pairs(quicktools):
+    prec = 4
+    edges = randomEdges(random.Random(11), 200)
+    expected = set()
+    for edge, hits in bruteHits(edges).items():
+        expected.update(quicktools.splitEdge(edge, hits.values(), prec))
+    assert quicktools.splitEdges(edges, prec) == expected
+
+
+def brutePrune(edges):
+    """Take away edges with a dangling end until none is left"""
+    edges = set(edges)
+    while True:
+        degree = {}
+        for v1, v2 in edges:
+            degree[v1] = degree.get(v1, 0) + 1
+            degree[v2] = degree.get(v2, 0) + 1
+        dangling = { edge for edge in edges if degree[edge[0]] == 1 or degree[edge[1]] == 1 }
+        if len(dangling) == 0:
+            return edges
+        edges -= dangling
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_prune_edges_match_repeated_peeling(quicktools, seed):
+    rng = random.Random(seed)
+    # integer lattice edges so snapping to the threshold grid changes nothing
+    points = [ (float(rng.randrange(8)), float(rng.randrange(8))) for _ in range(60) ]
+    edges = set()
+    for _ in range(90):
+        v1, v2 = rng.sample(points, 2)
+        if v1 != v2 and (v2, v1) not in edges:
+            edges.add( (v1, v2) )
+    assert quicktools.pruneEdges(edges, 0.5) == brutePrune(edges)
+
+
+def test_prune_edges_keeps_cycles_and_drops_tails(quicktools):
+    square = { ((0.0, 0.0), (1.0, 0.0)), ((1.0, 0.0), (1.0, 1.0)), ((1.0, 1.0), (0.0, 1.0)), ((0.0, 1.0), (0.0, 0.0)) }
+    tail = { ((1.0, 1.0), (2.0, 2.0)), ((2.0, 2.0), (3.0, 2.0)) }
+    assert quicktools.pruneEdges(square | tail, 0.1) == square
+
+
+def gridEdges(cols, rows):
+    """Unit grid lines split at every crossing"""
+    edges = set()
+    for x in range(cols + 1):
+        for y in range(rows):
+            edges.add( ((float(x), float(y)), (float(x), float(y + 1))) )
+    for y in range(rows + 1):
+        for x in range(cols):
+            edges.add( ((float(x), float(y)), (float(x + 1), float(y))) )
+    return edges
+
+
+def test_build_faces_of_a_grid(quicktools):
+    faces = quicktools.buildFaces(gridEdges(4, 3))
+    assert len(faces) == 12
+    for area, box, loop in faces:
+        assert area == pytest.approx(1.0)
+        assert len(loop) == 4
+        assert (box[2] - box[0], box[3] - box[1]) == (1.0, 1.0)
+
+
+def test_build_faces_of_nested_squares(quicktools):
+    def square(lo, hi):
+        corners = [ (lo, lo), (hi, lo), (hi, hi), (lo, hi) ]
+        return { (corners[idx - 1], corners[idx]) for idx in range(4) }
+
+    faces = quicktools.buildFaces(square(0.0, 4.0) | square(1.0, 3.0))
+    assert sorted(area for area, box, loop in faces) == pytest.approx([4.0, 16.0])
+
+
+def test_build_faces_of_random_arrangement(quicktools):
+    edges = quicktools.pruneEdges(quicktools.splitEdges(randomEdges(random.Random(5), 60, (3.0, 10.0)), 4), 0.00001)
+    faces = quicktools.buildFaces(edges)
+    assert len(faces) > 0
+
+    # every edge borders at most two faces and every face is a counter clockwise loop of the edges
+    used = {}
+    undirected = { frozenset(edge) for edge in edges }
+    for area, box, loop in faces:
+        assert area > 0
+        for idx in range(len(loop)):
+            side = frozenset( (loop[idx - 1], loop[idx]) )
+            assert side in undirected
+            used[side] = used.get(side, 0) + 1
+    assert max(used.values()) <= 2
+
+
+def overlaps(b1, b2):
+    return not (b1[0] > b2[2] or b1[2] < b2[0] or b1[1] > b2[3] or b1[3] < b2[1])
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_box_tree_query_matches_linear_scan(quicktools, seed):
+    rng = random.Random(seed)
+    entries = []
+    for idx in range(500):
+        x, y = rng.uniform(0, 100), rng.uniform(0, 100)
+        entries.append( ((x, y, x + rng.uniform(0, 5), y + rng.uniform(0, 5)), idx) )
+    tree = quicktools.boxTree(entries)
+
+    for _ in range(100):
+        x, y = rng.uniform(0, 100), rng.uniform(0, 100)
+        box = (x, y, x + rng.uniform(0, 10), y + rng.uniform(0, 10))
+        expected = sorted(idx for ebox, idx in entries if overlaps(ebox, box))
+        assert sorted(quicktools.boxTreeQuery(tree, box)) == expected
+
+
+def test_box_tree_of_nothing(quicktools):
+    assert quicktools.boxTree([]) == None
+    assert quicktools.boxTreeQuery(None, (0, 0, 1, 1)) == []
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_gap_bridges_join_nearest_ends(quicktools, seed):
+    rng = random.Random(seed)
+    ends = [ (rng.uniform(0, 10), rng.uniform(0, 10)) for _ in range(300) ]
+    tolerance = 0.3
+    expected = set()
+    for pt in ends:
+        near = sorted( (math.dist(pt, other), other) for other in ends if other != pt and math.dist(pt, other) <= tolerance )
+        if near:
+            expected.add( tuple(sorted( (pt, near[0][1]) )) )
+    assert quicktools.gapBridges(ends, tolerance) == expected
+
+
+def test_gap_bridges_skip_joined_ends(quicktools):
+    ends = [ (0.0, 0.0), (0.05, 0.0), (0.3, 0.0), (1.0, 1.0), (1.0, 1.0) ]
+    assert quicktools.gapBridges(ends, 0.1) == { ((0.0, 0.0), (0.05, 0.0)) }
+
+
+def randomStrokes(rng, count):
+    strokes = {}
+    for sdx in range(count):
+        x, y = rng.uniform(0, 10), rng.uniform(0, 10)
+        pts = [ (round(x, 4), round(y, 4)) ]
+        for _ in range(rng.randrange(1, 5)):
+            x += rng.uniform(-4, 4)
+            y += rng.uniform(-4, 4)
+            pts.append( (round(x, 4), round(y, 4)) )
+        pts = tuple(pts)
+        cyclic = sdx % 3 == 0
+        edges = set(zip(pts, pts[1:]))
+        if cyclic:
+            edges.add( (pts[-1], pts[0]) )
+        strokes[('layer', 1, pts, cyclic)] = edges
+    return strokes
+
+
+def graphState(graph):
+    faces = sorted( (round(area, 6), tuple(round(v, 6) for v in box)) for area, box, loop in graph.faces )
+    return set(graph.edges), faces
+
+
+def test_planar_graph_incremental_matches_full_rebuild(quicktools):
+    rng = random.Random(2)
+    strokes = randomStrokes(rng, 40)
+    keys = list(strokes)
+
+    graph = quicktools.PlanarGraph(4, 0.00001)
+    steps = [ keys[:25], keys[:40], keys[10:40], keys[10:30] + keys[:5], keys[:5] ]
+    for step in steps:
+        current = { key : strokes[key] for key in step }
+        graph.update(current)
+        assert graph.error == None
+
+        full = quicktools.PlanarGraph(4, 0.00001)
+        full.update(current)
+        assert graphState(graph) == graphState(full)
+
+
+def test_planar_graph_unchanged_strokes(quicktools):
+    strokes = randomStrokes(random.Random(4), 10)
+    graph = quicktools.PlanarGraph(4, 0.00001)
+    assert graph.update(strokes)
+    assert not graph.update(dict(strokes))
+
+
+def lineDistance(pt, a, b):
+    (px, py), (x1, y1), (x2, y2) = pt, a, b
+    length = math.hypot(x2 - x1, y2 - y1)
+    if length == 0:
+        return math.hypot(px - x1, py - y1)
+    return abs((y2 - y1) * (px - x1) - (x2 - x1) * (py - y1)) / length
+
+
+def assertWithinTolerance(points, kept, tolerance, closed):
+    """kept is an ordered subset of points and every dropped point lies near the line between its kept neighbours"""
+    index = [ points.index(pt) for pt in kept ]
+    assert index == sorted(index)
+    n = len(points)
+    pairs = list(zip(index, index[1:]))
+    if closed:
+        pairs.append( (index[-1], index[0] + n) )
+    for first, last in pairs:
+        for idx in range(first + 1, last):
+            assert lineDistance(points[idx % n], points[first], points[last % n]) <= tolerance + 1e-9
+
+
+@pytest.mark.parametrize("tolerance", [0.01, 0.1, 0.5])
+def test_simplify_polyline(quicktools, tolerance):
+    rng = random.Random(1)
+    points = [ (idx * 0.1, math.sin(idx * 0.2) + rng.uniform(-0.05, 0.05)) for idx in range(200) ]
+    kept = quicktools.simplifyPolyline(points, tolerance)
+    assert kept[0] == points[0] and kept[-1] == points[-1]
+    assertWithinTolerance(points, kept, tolerance, False)
+
+
+@pytest.mark.parametrize("tolerance", [0.01, 0.1, 0.5])
+def test_simplify_loop(quicktools, tolerance):
+    rng = random.Random(2)
+    loop = [ ((3 + rng.uniform(-0.05, 0.05)) * math.cos(a), (2 + rng.uniform(-0.05, 0.05)) * math.sin(a))
+        for a in numpy.linspace(0, 2 * math.pi, 150, endpoint=False) ]
+    kept = quicktools.simplifyLoop(loop, tolerance)
+    assert kept[0] == loop[0]
+    assert len(kept) >= 3
+    assertWithinTolerance(loop, kept, tolerance, True)
+
+
+def test_simplify_loop_keeps_triangles(quicktools):
+    triangle = [ (0.0, 0.0), (1.0, 0.0), (0.0, 1.0) ]
+    assert quicktools.simplifyLoop(triangle, 10.0) == triangle
@@ -0,0 +1,212 @@
+"""Stroke editing helpers checked on real Grease Pencil drawings"""
+
+import math
+import random
+import types
+
+import pytest
+
+bpy = pytest.importorskip("bpy") # Blender's Python or the bpy module, see conftest.py
+mathutils = pytest.importorskip("mathutils")
+numpy = pytest.importorskip("numpy")
+
+
+def newLayer(name="layer"):
+    gp = bpy.data.grease_pencils_v3.new("test")
+    return gp, gp.layers.new(name)
+
+
+def newDrawing(layer, points):
+    """Drawing on frame 1 of layer with a stroke per list of x, z points"""
+    drawing = layer.frames.new(1).drawing
+    drawing.add_strokes([ len(pts) for pts in points ])
+    positions = [ c for pts in points for x, z in pts for c in (x, 0.0, z) ]
+    drawing.attributes['position'].data.foreach_set('vector', positions)
+    return drawing
+
+
+def selectStrokes(drawing, flags):
+    """Stroke selection (CURVE domain), a drawing without a selection attribute counts as all selected"""
+    for stroke, flag in zip(drawing.strokes, flags):
+        stroke.select = flag
+
+
+def strokePoints(quicktools, drawing):
+    positions = quicktools.attributeArray(drawing, 'position')
+    sizes = [ len(s.points) for s in drawing.strokes ]
+    starts = numpy.cumsum(sizes) - sizes
+    return [ positions[start:start + n, ::2].tolist() for start, n in zip(starts, sizes) ]
+
+
+def test_insert_stroke_points_copies_attributes(quicktools):
+    gp, layer = newLayer()
+    drawing = newDrawing(layer, [ [(0, 0), (1, 0), (2, 0)], [(0, 1), (1, 1)] ])
+    quicktools.writeAttribute(drawing, 'radius', 'FLOAT', 'POINT', 0, [0.1, 0.2, 0.3, 0.4, 0.5])
+    drawing.attributes.new('.selection', 'BOOLEAN', 'POINT')
+
+    inserts = { 0 : [ (0, (0.5, 0.0, 0.0)), (2, (3.0, 0.0, 0.0)) ] }
+    quicktools.insertStrokePoints(drawing, [3, 2], inserts)
+
+    assert strokePoints(quicktools, drawing) == [ [[0, 0], [0.5, 0], [1, 0], [2, 0], [3, 0]], [[0, 1], [1, 1]] ]
+    numpy.testing.assert_allclose(quicktools.attributeArray(drawing, 'radius')[:, 0], [0.1, 0.1, 0.2, 0.3, 0.3, 0.4, 0.5])
+    assert drawing.attributes['.selection'].domain == 'POINT'
+    assert quicktools.attributeArray(drawing, '.selection')[:, 0].tolist() == [False, True, False, False, True, False, False]
+
+
+def test_insert_stroke_points_without_selection(quicktools):
+    gp, layer = newLayer()
+    drawing = newDrawing(layer, [ [(0, 0), (1, 0)] ])
+    assert drawing.attributes.get('.selection') == None
+
+    quicktools.insertStrokePoints(drawing, [2], { 0 : [ (0, (0.5, 0.0, 0.0)) ] })
+
+    # nothing stored means everything selected, the points stay selected
+    assert quicktools.attributeArray(drawing, '.selection')[:, 0].tolist() == [True, True, True]
+
+
+def test_insert_stroke_points_keeps_stroke_selection(quicktools):
+    gp, layer = newLayer()
+    drawing = newDrawing(layer, [ [(0, 0), (1, 0)], [(0, 1), (1, 1)] ])
+    selectStrokes(drawing, [True, False])
+    assert drawing.attributes['.selection'].domain == 'CURVE'
+
+    quicktools.insertStrokePoints(drawing, [2, 2], { 1 : [ (0, (0.5, 0.0, 1.0)) ] }, 'CURVE')
+
+    assert strokePoints(quicktools, drawing) == [ [[0, 0], [1, 0]], [[0, 1], [0.5, 1], [1, 1]] ]
+    assert drawing.attributes['.selection'].domain == 'CURVE'
+    assert [ s.select for s in drawing.strokes ] == [True, False]
+
+
+def bruteArcPoints(points, spacing):
+    """Walk the polyline and stop every total length / count"""
+    lengths = [ math.dist(points[idx], points[idx + 1]) for idx in range(len(points) - 1) ]
+    total = sum(lengths)
+    count = max(1, int(round(total / spacing)))
+    ret = []
+    for k in range(count + 1):
+        target = total * k / count
+        seg = 0
+        while seg < len(lengths) - 1 and target > lengths[seg]:
+            target -= lengths[seg]
+            seg += 1
+        w = min(target / lengths[seg], 1.0) if lengths[seg] > 0 else 0.0
+        (x1, y1), (x2, y2) = points[seg], points[seg + 1]
+        ret.append( (x1 + (x2 - x1) * w, y1 + (y2 - y1) * w) )
+    return ret
+
+
+@pytest.mark.parametrize("spacing", [0.005, 0.05, 0.3, 5.0])
+def test_arc_samples_match_walk(quicktools, spacing):
+    rng = random.Random(6)
+    points = numpy.array([ (rng.uniform(0, 1), rng.uniform(0, 1)) for _ in range(12) ])
+    lengths = numpy.linalg.norm(numpy.diff(points, axis=0), axis=1)
+    seg, weight = quicktools.arcSamples(lengths, spacing)
+    samples = points[seg] + (points[seg + 1] - points[seg]) * weight[:, None]
+
+    assert tuple(samples[0]) == tuple(points[0])
+    assert tuple(samples[-1]) == tuple(points[-1])
+    numpy.testing.assert_allclose(samples, bruteArcPoints(points.tolist(), spacing), atol=1e-9)
+
+
+def test_arc_samples_skip_zero_length_segments(quicktools):
+    points = numpy.array([ (0.0, 0.0), (1.0, 0.0), (1.0, 0.0), (2.0, 0.0) ])
+    lengths = numpy.linalg.norm(numpy.diff(points, axis=0), axis=1)
+    seg, weight = quicktools.arcSamples(lengths, 0.5)
+    samples = points[seg] + (points[seg + 1] - points[seg]) * weight[:, None]
+    numpy.testing.assert_allclose(samples[:, 0], [0.0, 0.5, 1.0, 1.5, 2.0])
+
+
+def test_stroke_snapshot_resamples_selected_strokes(quicktools):
+    gp, layer = newLayer()
+    drawing = newDrawing(layer, [ [(0, 0), (1, 0), (3, 0)], [(0, 1), (1, 1), (3, 1)] ])
+    selectStrokes(drawing, [True, False])
+
+    snapshot = quicktools.StrokeSnapshot(drawing)
+    assert snapshot.selected.tolist() == [True] * 3 + [False] * 3
+    sizes, arrays = snapshot.resample(0.5)
+
+    assert sizes.tolist() == [7, 3]
+    numpy.testing.assert_allclose(arrays['position'][:7, 0], [0.0, 0.5, 1.0, 1.5, 2.0, 2.5, 3.0], atol=1e-6)
+    numpy.testing.assert_array_equal(arrays['position'][7:], snapshot.arrays['position'][3:])
+    # resampling leaves the drawing alone
+    assert [ len(s.points) for s in drawing.strokes ] == [3, 3]
+
+
+def test_stroke_snapshot_resamples_selected_run(quicktools):
+    gp, layer = newLayer()
+    drawing = newDrawing(layer, [ [(0, 0), (1, 0), (2, 0), (3, 0)] ])
+    drawing.attributes.new('.selection', 'BOOLEAN', 'POINT')
+    quicktools.writeAttribute(drawing, '.selection', 'BOOLEAN', 'POINT', 0, [False, True, True, False])
+
+    sizes, arrays = quicktools.StrokeSnapshot(drawing).resample(0.25)
+
+    assert sizes.tolist() == [7]
+    numpy.testing.assert_allclose(arrays['position'][:, 0], [0.0, 1.0, 1.25, 1.5, 1.75, 2.0, 3.0], atol=1e-6)
+
+
+def test_stroke_snapshot_apply_and_restore(quicktools):
+    gp, layer = newLayer()
+    drawing = newDrawing(layer, [ [(0, 0), (2, 0)], [(0, 1), (1, 1)] ])
+    selectStrokes(drawing, [True, False])
+    original = strokePoints(quicktools, drawing)
+
+    snapshot = quicktools.StrokeSnapshot(drawing)
+    snapshot.apply(drawing, *snapshot.resample(0.5))
+    assert [ len(s.points) for s in drawing.strokes ] == [5, 2]
+    numpy.testing.assert_allclose(quicktools.attributeArray(drawing, 'position')[:5, 0], [0.0, 0.5, 1.0, 1.5, 2.0], atol=1e-6)
+
+    # a second spacing starts again from the snapshot, not from the applied strokes
+    snapshot.apply(drawing, *snapshot.resample(1.0))
+    assert [ len(s.points) for s in drawing.strokes ] == [3, 2]
+
+    snapshot.restore(drawing)
+    assert strokePoints(quicktools, drawing) == original
+
+
+def test_submerge_snapshots_carry_world_matrix(quicktools):
+    gp, layer = newLayer()
+    newDrawing(layer, [ [(0, 0), (1, 0)] ])
+    layer.translation = (0.0, 0.0, 1.0)
+    hidden = gp.layers.new("hidden")
+    newDrawing(hidden, [ [(0, 0), (1, 0)] ])
+    hidden.hide = True
+    unselected = gp.layers.new("unselected")
+    selectStrokes(newDrawing(unselected, [ [(0, 0), (1, 0)] ]), [False])
+
+    obj = bpy.data.objects.new("test", gp)
+    obj.matrix_world = mathutils.Matrix.Translation((1.0, 2.0, 3.0))
+    operator = types.SimpleNamespace()
+    quicktools.quickSubMergeOperator.take_snapshots(operator, types.SimpleNamespace(active_object=obj))
+
+    assert len(operator._snapshots) == 1
+    drawing, snapshot, matrix = operator._snapshots[0]
+    assert drawing == layer.current_frame().drawing
+    numpy.testing.assert_allclose(matrix, numpy.array(obj.matrix_world @ layer.matrix_local))
+    numpy.testing.assert_allclose(matrix[:3, 3], [1.0, 2.0, 4.0])
+
+
+@pytest.mark.parametrize("domain", ['POINT', 'CURVE', None])
+def test_hardness_targets_follow_selection_domain(quicktools, domain):
+    gp, layer = newLayer()
+    drawing = newDrawing(layer, [ [(0, 0), (1, 0), (2, 0)], [(0, 1), (1, 1)] ])
+    if domain == 'POINT':
+        drawing.strokes[0].points[1].select = True
+    elif domain == 'CURVE':
+        selectStrokes(drawing, [True, False])
+    assert (drawing.attributes['.selection'].domain if domain else drawing.attributes.get('.selection')) == domain
+
+    obj = bpy.data.objects.new("test", gp)
+    targets = quicktools.quickHardnessOperator.get_targets(None, types.SimpleNamespace(active_object=obj))
+
+    assert len(targets) == 1
+    target, point_mask, stroke_mask, sizes = targets[0]
+    assert target == drawing
+    assert sizes.tolist() == [3, 2]
+    if domain == 'POINT':
+        assert stroke_mask.tolist() == [True, False]
+        assert point_mask.tolist() == [False, True, False, False, False]
+    elif domain == 'CURVE':
+        assert stroke_mask.tolist() == [True, False]
+        assert point_mask.tolist() == [True, True, True, False, False]
+    else: # nothing stored, everything is selected
+        assert point_mask.all() and stroke_mask.all()